@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import time
+
+import pygame
+
+from scripts.chunks import ChunkedTilemap, chunk_file
+from scripts.mapfile import read_binary
+from scripts.mapgen import generate, parse_size, write_generated
+
+
+def chunk_on_disk(path, chunk):
+    map_data = read_binary(chunk_file(path, chunk))
+    return map_data["tilemap"], map_data["offgrid"]
+
+
+def check_edits(path, chunks, pending):
+    # Edits one cell and one off-grid tile in every chunk while none of them
+    # is resident, saves, and returns the chunks that lost tiles on disk. With
+    # pending set, a non-blocking stream queues the reads first, so the edits
+    # race the loader thread instead of finding nothing in flight.
+    tilemap = ChunkedTilemap(None, tile_size=16)
+    tilemap.load(path)
+    before = {chunk: chunk_on_disk(path, chunk) for chunk in chunks}
+    if pending:
+        span = tilemap.chunk_size * tilemap.tile_size
+        for chunk in chunks:
+            tilemap.stream(pygame.Rect(chunk[0] * span, chunk[1] * span, 1, 1))
+
+    edits = {}
+    start = time.perf_counter()
+    for chunk in chunks:
+        loc = (chunk[0] * tilemap.chunk_size, chunk[1] * tilemap.chunk_size)
+        tilemap.set_tile(loc, "stone", 0)
+        tile = {
+            "type": "decor",
+            "variant": 0,
+            "pos": [loc[0] * tilemap.tile_size + 0.5, loc[1] * tilemap.tile_size + 0.5],
+        }
+        tilemap.add_offgrid(tile)
+        edits[chunk] = (loc, tile)
+    elapsed = time.perf_counter() - start
+    tilemap.save()
+
+    broken = []
+    for chunk, (loc, tile) in edits.items():
+        grid, offgrid = chunk_on_disk(path, chunk)
+        old_grid, old_offgrid = before[chunk]
+        expected = set(old_grid) | {loc}
+        if set(grid) != expected or len(offgrid) != len(old_offgrid) + 1:
+            broken.append((chunk, len(old_grid), len(grid)))
+    return broken, elapsed / len(chunks)
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.chunk_edits [size]
+#   size  generated world size in cells as WIDTHxHEIGHT (default 400x240)
+# Edits every chunk of a generated chunked world without streaming it in
+# first, saves, and checks no chunk lost tiles on disk; then repeats with the
+# chunk reads already queued on the loader thread. Reports the time per edit
+# of a cold chunk. Exits with status 1 if any chunk lost tiles.
+# ==============================================================================
+if __name__ == "__main__":
+    width, height = parse_size(sys.argv[1]) if len(sys.argv) > 1 else (400, 240)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pending in (False, True):
+            path = os.path.join(tmp, "world" + str(int(pending)))
+            write_generated(path, generate(width, height))
+            tilemap = ChunkedTilemap(None)
+            tilemap.load(path)
+            chunks = sorted(tilemap.available)
+            broken, per_edit = check_edits(path, chunks, pending)
+            mode = "queued reads" if pending else "cold chunks"
+            print(
+                f"{mode:>12}: {len(chunks)} chunks edited,"
+                f" {per_edit * 1000:.2f} ms per chunk, {len(broken)} lost tiles"
+            )
+            for chunk, old, new in broken:
+                failures.append(f"{mode}: chunk {chunk} went from {old} to {new} tiles")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
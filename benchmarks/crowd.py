@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from scripts.audio import Audio
+from scripts.crowd import BlobCrowd
+from scripts.entities import Blob, Player
+from scripts.utils import Animation
+
+
+def make_game():
+    frame = [pygame.Surface((1, 1))]
+    assets = {
+        name: Animation(frame)
+        for name in (
+            "tblob/idle",
+            "enemy/idle",
+            "player/idle",
+            "player/walk",
+            "player/jump",
+            "particle/particle",
+            "particle/leaf",
+        )
+    }
+    return SimpleNamespace(assets=assets, audio=Audio(enabled=False), projectiles=[])
+
+
+def make_crowd(game, count, spread):
+    # Half the blobs start within aggro range so both branches get exercised.
+    blobs = []
+    for i in range(count):
+        radius = spread if i % 2 else 100
+        pos = (random.uniform(-radius, radius), random.uniform(-radius, radius))
+        blobs.append(Blob(game, pos, (65, 65)))
+    return blobs
+
+
+def run(step, blobs, player, frames):
+    start = time.perf_counter()
+    for i in range(frames):
+        step(blobs, player)
+    return (time.perf_counter() - start) / frames
+
+
+def update_each(blobs, player):
+    for blob in blobs:
+        blob.update(player, None)
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.crowd [count] [frames]
+#   count   number of blobs in the crowd (default 500)
+#   frames  crowd steps timed per mode, the mean is reported (default 200)
+# ==============================================================================
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    pygame.init()
+    game = make_game()
+    player = Player(game, (0, 0), (8, 15))
+
+    random.seed(0)
+    per_blob = run(update_each, make_crowd(game, count, 2000), player, frames)
+    random.seed(0)
+    crowd = BlobCrowd(make_crowd(game, count, 2000))
+    batched = run(crowd.update, crowd.blobs, player, frames)
+
+    budget = 1000 / 60
+    print(f"{'mode':>10} {'ms/frame':>10} {'% of 60fps':>10}")
+    for name, seconds in (("per-blob", per_blob), ("batched", batched)):
+        print(f"{name:>10} {seconds * 1000:>10.3f} {seconds * 1000 / budget:>10.1%}")
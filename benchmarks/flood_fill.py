@@ -0,0 +1,77 @@
+import sys
+import time
+
+from scripts.history import EditHistory
+from scripts.mapgen import parse_size
+from scripts.tilemap import Tilemap, collector_paused
+
+REPEAT = 5
+
+
+def walled(width, height):
+    # An empty room of width by height cells inside a one-cell grass wall.
+    tilemap = Tilemap(None, tile_size=16)
+    for x in range(-1, width + 1):
+        tilemap.set_tile((x, -1), "grass", 1)
+        tilemap.set_tile((x, height), "grass", 1)
+    for y in range(height):
+        tilemap.set_tile((-1, y), "grass", 1)
+        tilemap.set_tile((width, y), "grass", 1)
+    return tilemap
+
+
+def fill(width, height):
+    # Times each step of the editor's fill tool with autotiling on, the way
+    # Editor.apply_changes runs them, then undoing it.
+    tilemap = walled(width, height)
+    history = EditHistory(tilemap)
+    times = {}
+    start = time.perf_counter()
+
+    def lap(name):
+        nonlocal start
+        now = time.perf_counter()
+        times[name] = now - start
+        start = now
+
+    with collector_paused():
+        region, complete = tilemap.flood_region((0, 0))
+        lap("flood")
+        changes = {loc: ("grass", 1) for loc in region}
+        border = tilemap.border(changes)
+        lap("border")
+        history.touch(changes)
+        history.touch(border)
+        lap("touch")
+        tilemap.apply(changes, autotile=True, border=border)
+        lap("apply")
+        history.end()
+        lap("history")
+    # The first container allocated after the pause runs the collection it
+    # put off.
+    catch_up = [None]
+    lap("collect")
+    times["total"] = sum(times.values())
+    if not complete or len(region) != width * height:
+        raise RuntimeError("fill did not cover the room")
+
+    start = time.perf_counter()
+    history.undo()
+    lap("undo")
+    return times
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.flood_fill [size]
+#   size  room size in cells as WIDTHxHEIGHT (default 400x250, 100k cells)
+# Flood fills an empty walled room as the editor's fill tool does, autotiling
+# the result, recording it for undo and then undoing it. Reports the best of
+# REPEAT runs for each step in ms.
+# ==============================================================================
+if __name__ == "__main__":
+    width, height = parse_size(sys.argv[1]) if len(sys.argv) > 1 else (400, 250)
+
+    runs = [fill(width, height) for i in range(REPEAT)]
+    print(f"{width * height} cells, best of {REPEAT}")
+    for name in runs[0]:
+        print(f"{name:>8}: {min(run[name] for run in runs) * 1000:8.1f} ms")
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import time
+
+from scripts.mapfile import BINARY_EXT, read_map, write_map
+
+MAP_DIR = "data/maps"
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def widen(map_data, copies):
+    # Repeat the map side by side to get a larger map with the same tile mix.
+    xs = [loc[0] for loc in map_data["tilemap"]]
+    width = max(xs) - min(xs) + 1
+    tilemap = {}
+    for i in range(copies):
+        for loc, tile in map_data["tilemap"].items():
+            new_loc = (loc[0] + i * width, loc[1])
+            tilemap[new_loc] = {
+                "type": tile["type"],
+                "variant": tile["variant"],
+                "pos": list(new_loc),
+            }
+    return {
+        "tilemap": tilemap,
+        "tile_size": map_data["tile_size"],
+        "offgrid": map_data["offgrid"] * copies,
+    }
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.map_load [copies] [repeat]
+#   copies  how many times each map is repeated side by side (default 1)
+#   repeat  timing runs per map, the best one is reported (default 20)
+# ==============================================================================
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(
+        f"{'map':>8} {'tiles':>8} {'json kB':>8} {'bin kB':>8} {'json ms':>8} {'bin ms':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(os.listdir(MAP_DIR)):
+            if not name.endswith(BINARY_EXT):
+                continue
+            map_data = widen(read_map(os.path.join(MAP_DIR, name)), copies)
+            json_path = os.path.join(tmp, "map.json")
+            bin_path = os.path.join(tmp, "map.map")
+            write_map(json_path, map_data)
+            write_map(bin_path, map_data)
+
+            json_time = best_of(lambda: read_map(json_path), repeat)
+            bin_time = best_of(lambda: read_map(bin_path), repeat)
+            print(
+                f"{name:>8} {len(map_data['tilemap']):>8}"
+                f" {os.path.getsize(json_path) / 1024:>8.1f}"
+                f" {os.path.getsize(bin_path) / 1024:>8.1f}"
+                f" {json_time * 1000:>8.3f} {bin_time * 1000:>8.3f}"
+            )
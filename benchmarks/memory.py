@@ -0,0 +1,46 @@
+import os
+import sys
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from benchmarks.crowd import make_game
+from scripts.entities import Blob, Enemy, Player
+from scripts.particle import Particle
+from scripts.spark import Spark
+
+
+def bytes_per_object(make, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [make(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Don't charge the holding list to the objects.
+    total -= sys.getsizeof(objects)
+    return total / count
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.memory [count]
+#   count  live objects created per kind (default 10000)
+# ==============================================================================
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    pygame.init()
+    game = make_game()
+    kinds = {
+        "spark": lambda i: Spark((i, i), 0.5, 2.0),
+        "particle": lambda i: Particle(game, "particle", (i, i)),
+        "enemy": lambda i: Enemy(game, (i, i), (8, 15)),
+        "blob": lambda i: Blob(game, (i, i), (65, 65)),
+        "player": lambda i: Player(game, (i, i), (8, 15)),
+    }
+
+    print(f"{'kind':>10} {'bytes':>10}")
+    for name, make in kinds.items():
+        print(f"{name:>10} {bytes_per_object(make, count):>10.0f}")
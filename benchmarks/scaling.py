@@ -0,0 +1,192 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from scripts.audio import Audio
+from scripts.entities import Enemy, PhysicsEntity, Player
+from scripts.levels import compile_level
+from scripts.mapfile import read_map, write_map
+from scripts.mapgen import generate, parse_size
+from scripts.quality import QualityGovernor
+from scripts.tilemap import Tilemap
+from scripts.utils import Animation
+
+SIZES = [(100, 60), (300, 180), (1000, 600), (2000, 1200)]
+# Enemy spawners per 1000 cells for the entity sweep.
+ENEMY_DENSITIES = [1, 3, 10, 30, 100]
+QUERIES = 1000
+FRAMES = 60
+VIEW = (320, 240)
+
+
+def make_game():
+    # Blank 1x1 images stand in for every tile, stone included, which the game
+    # has no images for.
+    frame = pygame.Surface((1, 1))
+    assets = {
+        tile_type: [frame] * 12
+        for tile_type in ("grass", "stone", "decor", "large_decor", "spawners")
+    }
+    for name in (
+        "enemy/idle",
+        "enemy/walk",
+        "player/idle",
+        "player/walk",
+        "player/jump",
+    ):
+        assets[name] = Animation([frame])
+    return SimpleNamespace(
+        assets=assets,
+        audio=Audio(enabled=False),
+        quality=QualityGovernor(),
+        projectiles=[],
+        sparks=[],
+    )
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def load_level(game, artifact):
+    tilemap = Tilemap(game, tile_size=16)
+    tilemap.load_data(artifact["map"])
+    return tilemap
+
+
+def measure(width, height, seed, tmp):
+    path = os.path.join(tmp, "map.map")
+    map_data, generate_ms = timed(lambda: generate(width, height, seed=seed))
+    _, write_ms = timed(lambda: write_map(path, map_data))
+    _, read_ms = timed(lambda: read_map(path))
+    artifact, compile_ms = timed(lambda: compile_level(path))
+
+    game = make_game()
+    tilemap = load_level(game, artifact)
+    _, autotile_ms = timed(tilemap.autotile)
+
+    # One falling, walking entity dropped at random points, as the game moves
+    # every entity: swept collision through physics_rects_in.
+    rng = random.Random(seed)
+    span = (width * 16, height * 16)
+    points = [
+        (rng.uniform(0, span[0]), rng.uniform(0, span[1])) for i in range(QUERIES)
+    ]
+    entity = PhysicsEntity(game, "enemy", (0, 0), (8, 15))
+
+    def sweep_all():
+        for point in points:
+            entity.pos = list(point)
+            entity.velocity = [0, 5]
+            entity.update(tilemap, (0.5, 0))
+
+    _, sweep_ms = timed(sweep_all)
+
+    surf = pygame.Surface(VIEW)
+    offsets = [(int(x), int(y)) for x, y in points[:100]]
+    _, render_ms = timed(
+        lambda: [tilemap.render(surf, offset=offset) for offset in offsets]
+    )
+
+    return [
+        f"{width}x{height}",
+        len(map_data["tilemap"]),
+        len(map_data["offgrid"]),
+        f"{os.path.getsize(path) / 1024:.0f}",
+        f"{generate_ms:.0f}",
+        f"{write_ms:.0f}",
+        f"{read_ms:.0f}",
+        f"{compile_ms:.0f}",
+        f"{autotile_ms:.0f}",
+        f"{sweep_ms / QUERIES * 1000:.1f}",
+        f"{render_ms / len(offsets):.2f}",
+    ]
+
+
+def measure_entities(width, height, density, seed, tmp):
+    # Steps every enemy of the map for FRAMES frames with the real AI, which
+    # walks, patrols with the navigation graph and collides through sweep.
+    path = os.path.join(tmp, "map.map")
+    write_map(path, generate(width, height, seed=seed, enemies=density))
+    artifact = compile_level(path)
+    level = artifact["level"]
+
+    game = make_game()
+    tilemap = load_level(game, artifact)
+    game.nav = level["nav"]
+    game.player = Player(game, level["player_spawn_pos"], (8, 15))
+    enemies = [Enemy(game, pos, (8, 15)) for pos in level["enemies"]]
+    # Half the enemies start alerted, so the chase branch and its navigation
+    # queries are timed along with patrolling.
+    for enemy in enemies[1::2]:
+        enemy.hit_timer = FRAMES
+
+    random.seed(seed)
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        for enemy in enemies:
+            enemy.update(tilemap, (0, 0))
+        game.projectiles.clear()
+        game.sparks.clear()
+    frame_ms = (time.perf_counter() - start) * 1000 / FRAMES
+
+    return [
+        density,
+        len(enemies),
+        f"{frame_ms:.2f}",
+        f"{frame_ms * 1000 / max(1, len(enemies)):.1f}",
+        f"{frame_ms / (1000 / 60):.1%}",
+    ]
+
+
+def print_row(row):
+    print(" ".join(f"{value:>10}" for value in row), flush=True)
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.scaling [seed] [size]
+#   seed  map generator seed (default 0)
+#   size  map size for the entity sweep, as WIDTHxHEIGHT (default 300x180)
+# Generates a map of each size in SIZES and times generating, writing, reading
+# and compiling it, a full autotile pass as the editor does, one entity's
+# swept collision step (us each) and rendering one 320x240 view (ms each).
+# Then steps every enemy of a map of the given size at each spawner density
+# in ENEMY_DENSITIES, reporting the frame time and its share of 60 fps.
+# ==============================================================================
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    width, height = parse_size(sys.argv[2]) if len(sys.argv) > 2 else (300, 180)
+
+    pygame.init()
+    with tempfile.TemporaryDirectory() as tmp:
+        print_row(
+            [
+                "size",
+                "tiles",
+                "off-grid",
+                "kB",
+                "gen ms",
+                "write ms",
+                "read ms",
+                "compile",
+                "autotile",
+                "sweep us",
+                "render ms",
+            ]
+        )
+        for size in SIZES:
+            print_row(measure(*size, seed, tmp))
+
+        print(f"\nenemies on a {width}x{height} map, {FRAMES} frames")
+        print_row(["per 1000", "enemies", "ms/frame", "us/enemy", "of 60fps"])
+        for density in ENEMY_DENSITIES:
+            print_row(measure_entities(width, height, density, seed, tmp))
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tracemalloc
+
+import pygame
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from main import Game
+
+MAP_DIR = "data/maps"
+TOP_SITES = 10
+
+
+def map_ids():
+    ids = set()
+    for name in os.listdir(MAP_DIR):
+        stem = os.path.splitext(name)[0]
+        if stem.isdigit():
+            ids.add(int(stem))
+    return sorted(ids)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+class SoakDriver:
+    # Stands in for the game's clock: tick() runs once per frame, so it plays
+    # the game with scripted input, moves on to the next map every
+    # level_frames, and samples memory. CPython has no allocation counter, so
+    # per-frame churn is measured as the traced peak above the frame's
+    # starting size, plus the net change in allocated blocks.
+    def __init__(self, game, args):
+        self.game = game
+        self.args = args
+        self.maps = map_ids()
+        self.map_index = 0
+        self.clock = pygame.time.Clock()
+        self.random = random.Random(args.seed)
+        self.frame = 0
+        self.held = 1
+
+        self.baseline = None
+        self.last = None
+        self.frame_start = tracemalloc.get_traced_memory()[0]
+        self.transient = []
+        self.blocks = sys.getallocatedblocks()
+        self.worst_transient = 0
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+    def get_rawtime(self):
+        return self.clock.get_rawtime()
+
+    def tick(self, framerate=0):
+        current, peak = tracemalloc.get_traced_memory()
+        self.transient.append(peak - self.frame_start)
+        self.frame += 1
+
+        self.play()
+        if self.frame % self.args.level_frames == 0:
+            self.next_map()
+        if self.frame % self.args.interval == 0:
+            self.report()
+        if self.frame >= self.args.frames:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+        tracemalloc.reset_peak()
+        self.frame_start = tracemalloc.get_traced_memory()[0]
+        return self.clock.tick()
+
+    def press(self, key):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+
+    def play(self):
+        game = self.game
+        game.show_start_screen = False
+        if game.game_completed:
+            self.press(pygame.K_SPACE)
+            return
+
+        if self.random.random() < 1 / 120:
+            self.held = self.random.choice((-1, 0, 1))
+        game.movement = [self.held < 0, self.held > 0]
+        if self.random.random() < 1 / 45:
+            self.press(pygame.K_w)
+        if self.random.random() < 1 / 200:
+            self.press(pygame.K_SPACE)
+        if self.random.random() < 1 / 20:
+            pos = (self.random.randrange(640), self.random.randrange(480))
+            pygame.event.post(
+                pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos)
+            )
+        if game.player.ammo == 0 and self.random.random() < 1 / 60:
+            self.press(pygame.K_r)
+
+    def next_map(self):
+        self.map_index = (self.map_index + 1) % len(self.maps)
+        self.game.level = self.maps[self.map_index]
+        self.game.load_level(self.game.level)
+
+    def report(self):
+        snapshot = take_snapshot()
+        traced = sum(stat.size for stat in snapshot.statistics("filename"))
+        blocks = sys.getallocatedblocks()
+        blocks_per_frame = (blocks - self.blocks) / self.args.interval
+        self.blocks = blocks
+        mean_transient = sum(self.transient) / len(self.transient)
+        max_transient = max(self.transient)
+        self.transient = []
+
+        if self.frame >= self.args.warmup:
+            self.worst_transient = max(self.worst_transient, mean_transient)
+            if self.baseline is None:
+                self.baseline = snapshot
+            self.last = snapshot
+
+        print(
+            f"{self.frame:>9} {self.game.level:>5} {self.game.quality.level:>3}"
+            f" {traced / 1024:>10.0f}"
+            f" {mean_transient / 1024:>10.1f} {max_transient / 1024:>10.1f}"
+            f" {blocks_per_frame:>10.2f} {peak_rss_mb():>8.1f}",
+            flush=True,
+        )
+
+    def growth(self):
+        if self.baseline is None or self.last is self.baseline:
+            return 0, []
+        stats = self.last.compare_to(self.baseline, "lineno")
+        growing = [stat for stat in stats if stat.size_diff > 0]
+        return sum(stat.size_diff for stat in stats), growing[:TOP_SITES]
+
+    def failures(self):
+        failures = []
+        growth, sites = self.growth()
+        if growth / 1024 > self.args.max_growth:
+            failures.append(
+                f"traced memory grew {growth / 1024:.0f} kB after warmup"
+                f" (limit {self.args.max_growth} kB)"
+            )
+        if self.worst_transient / 1024 > self.args.max_transient:
+            failures.append(
+                f"frames allocated {self.worst_transient / 1024:.1f} kB on average"
+                f" (limit {self.args.max_transient} kB)"
+            )
+        if peak_rss_mb() > self.args.max_rss:
+            failures.append(
+                f"peak RSS {peak_rss_mb():.1f} MB (limit {self.args.max_rss} MB)"
+            )
+        return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Soak the game loop for leaks.")
+    parser.add_argument("frames", type=int, nargs="?", default=60 * 60 * 60)
+    parser.add_argument("--render", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", type=int, default=3600)
+    parser.add_argument("--level-frames", type=int, default=1800)
+    parser.add_argument("--warmup", type=int, default=None)
+    parser.add_argument("--max-growth", type=float, default=1024)
+    parser.add_argument("--max-transient", type=float, default=64)
+    parser.add_argument("--max-rss", type=float, default=512)
+    args = parser.parse_args()
+    if args.warmup is None:
+        args.warmup = args.level_frames * len(map_ids())
+    return args
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.soak [frames] [options]
+#   frames           simulated frames to run (default 216000, an hour at 60 fps)
+#   --render         open a real window instead of running headless
+#   --seed           seed for the scripted input and the game (default 0)
+#   --interval       frames between memory reports (default 3600)
+#   --level-frames   frames spent on each map before loading the next
+#                    (default 1800)
+#   --warmup         frames before the baseline snapshot (default one pass over
+#                    every map)
+#   --max-growth     fail if traced memory grows more than this many kB
+#                    between the baseline and the last report (default 1024)
+#   --max-transient  fail if a report's frames allocate more than this many kB
+#                    on average above their starting size (default 64)
+#   --max-rss        fail if peak RSS exceeds this many MB (default 512)
+# Exits with status 1 and lists the failed thresholds when any is exceeded.
+# ==============================================================================
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.render:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    random.seed(args.seed)
+    tracemalloc.start()
+    game = Game()
+    game.finish_loading()
+    driver = SoakDriver(game, args)
+    game.clock = driver
+
+    print(
+        f"{'frame':>9} {'map':>5} {'q':>3} {'traced kB':>10} {'kB/frame':>10}"
+        f" {'max kB':>10} {'blocks/f':>10} {'rss MB':>8}"
+    )
+    asyncio.run(game.main())
+
+    growth, sites = driver.growth()
+    print(f"\ntop growing allocation sites after warmup ({growth / 1024:+.0f} kB):")
+    for stat in sites:
+        frame = stat.traceback[0]
+        print(
+            f"  {stat.size_diff / 1024:+10.1f} kB {stat.count_diff:+8d} blocks"
+            f"  {frame.filename}:{frame.lineno}"
+        )
+
+    failures = driver.failures()
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,82 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PHASES = (
+    "import",
+    "sdl",
+    "start_screen",
+    "first_frame",
+    "howto",
+    "assets",
+    "audio",
+    "map",
+)
+TOTALS = ("first_frame", "ready")
+
+
+def measure():
+    # Runs in a fresh interpreter so import time is real: starts the game
+    # loop, lets it load in the background and quits once it is ready. main
+    # has to be imported first, or its import time would not include pygame.
+    from main import Game
+
+    import asyncio
+
+    import pygame
+
+    class QuitWhenReady:
+        def __init__(self, game):
+            self.game = game
+            self.clock = game.clock
+
+        def tick(self, framerate=0):
+            if self.game.loaded:
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+            return self.clock.tick()
+
+    game = Game()
+    game.clock = QuitWhenReady(game)
+    asyncio.run(game.main())
+    print(json.dumps(game.startup))
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--measure"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# ==============================================================================
+# Usage: python -m benchmarks.startup [runs]
+#   runs  fresh processes to start, the median of each phase is reported
+#         (default 5)
+# Phases are timed inside Game: import, SDL init, start screen, then the how-to
+# image, assets, audio and map loading, which happen after the first frame.
+# first_frame and ready are measured from the start of main.py's imports.
+# ==============================================================================
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--measure"]:
+        measure()
+        sys.exit()
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = [run_once() for i in range(runs)]
+
+    print(f"{'phase':>14} {'ms':>8}")
+    for phase in PHASES + ("ready",):
+        median = statistics.median(sample[phase] for sample in samples)
+        label = phase + (" *" if phase in TOTALS else "")
+        print(f"{label:>14} {median * 1000:>8.1f}")
+    print("* time since main.py started importing")
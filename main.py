@@ -1,107 +1,249 @@
+import time
+
+STARTED = time.perf_counter()
+
 import os
 import sys
 import math
-import random
 import asyncio
 import pygame
 
 from scripts.utils import load_image, load_images, Animation
 from scripts.entities import PhysicsEntity, Player, Enemy, Blob
+from scripts.crowd import crowd_for
+from scripts.mapfile import BINARY_EXT, resolve_map
+from scripts.chunks import is_world, open_tilemap
 from scripts.tilemap import Tilemap
 from scripts.clouds import Clouds
-from scripts.particle import Particle
+from scripts.audio import Audio
+from scripts.particle import update_particles
+from scripts.emitters import LeafEmitters
+from scripts.levels import derive, load_compiled
+from scripts.drawqueue import (
+    DrawQueue,
+    LAYER_ENTITIES,
+    LAYER_PARTICLES,
+    LAYER_PROJECTILES,
+    LAYER_TILES,
+)
+from scripts.quality import QualityGovernor
+from scripts.registry import Registry
+from scripts.snapshot import SnapshotRing, capture, restore
 from scripts.spark import Spark
 
+IMPORTED = time.perf_counter()
+
+# Frames between rewind snapshots, and how many snapshots one rewind goes back.
+REWIND_INTERVAL = 30
+REWIND_STEPS = 2
+
 
 class Game:
+    # Startup is split into phases timed in self.startup (seconds). Only what
+    # the start screen needs is set up here; its image, the assets, audio and
+    # first level are loaded by load() while the start screen is showing.
     def __init__(self):
-        pygame.init()
+        self.startup = {"import": IMPORTED - STARTED}
+        self.loaded = False
+
+        start = time.perf_counter()
+        pygame.mixer.pre_init(44100, -16, 2, 512)
+        pygame.display.init()
         pygame.font.init()
 
         pygame.display.set_caption("Tiny Hunter")
         self.screen = pygame.display.set_mode((640, 480))
         self.display = pygame.Surface((320, 240), pygame.SRCALPHA)
         self.display_2 = pygame.Surface((320, 240))
+        self.startup["sdl"] = time.perf_counter() - start
 
+        start = time.perf_counter()
         self.clock = pygame.time.Clock()
 
         self.movement = [False, False]
 
-        self.font = pygame.font.Font(None, 16)
         self.ui_font = pygame.font.Font(None, 24)
         self.large_font = pygame.font.Font(None, 48)
+        self.assets = {}
 
-        self.assets = {
-            "decor": load_images("tiles/decor"),
-            "spawners": load_images("tiles/spawners"),
-            "grass": load_images("tiles/grass"),
-            "large_decor": load_images("tiles/large_decor"),
-            "player": load_image("entities/player.png"),
-            "background": load_image("background.png"),
-            "clouds": load_images("clouds"),
-            "tblob/idle": Animation(load_images("entities/blob/idle"), img_dur=6),
-            "enemy/idle": Animation(load_images("entities/enemy/idle"), img_dur=6),
-            "enemy/walk": Animation(load_images("entities/enemy/walk"), img_dur=4),
-            "player/idle": Animation(load_images("entities/player/idle"), img_dur=6),
-            "player/walk": Animation(load_images("entities/player/walk"), img_dur=4),
-            "player/jump": Animation(load_images("entities/player/jump")),
-            "particle/leaf": Animation(
-                load_images("particles/leaf"), img_dur=20, loop=False
-            ),
-            "particle/particle": Animation(
-                load_images("particles/particle"), img_dur=6, loop=False
-            ),
-            "gun": load_image("gun.png"),
-            "projectile": load_image("projectile.png"),
-            "howto": load_image("how to.png"),
-        }
-
-        self.clouds = Clouds(self.assets["clouds"], count=16)
+        self.game_completed = False
+        self.completion_time = 0
+        self.show_start_screen = True
+        self.quality = QualityGovernor()
+        self.registry = Registry(("enemies", "blobs", "projectiles", "sparks"))
+        self.enemies = self.registry["enemies"]
+        self.blobs = self.registry["blobs"]
+        self.projectiles = self.registry["projectiles"]
+        self.sparks = self.registry["sparks"]
+        self.show_quality = False
+        self.startup["start_screen"] = time.perf_counter() - start
+
+    def timed(self, phase, step, *args):
+        start = time.perf_counter()
+        step(*args)
+        self.startup[phase] = time.perf_counter() - start
+
+    def load_howto(self):
+        # Until this is loaded the start screen shows its plain text version.
+        self.assets["howto"] = load_image("how to.png")
+
+    def load_assets(self):
+        self.assets.update(
+            {
+                "decor": load_images("tiles/decor"),
+                "spawners": load_images("tiles/spawners"),
+                "grass": load_images("tiles/grass"),
+                "large_decor": load_images("tiles/large_decor"),
+                "player": load_image("entities/player.png"),
+                "background": load_image("background.png"),
+                "clouds": load_images("clouds"),
+                "tblob/idle": Animation(load_images("entities/blob/idle"), img_dur=6),
+                "enemy/idle": Animation(load_images("entities/enemy/idle"), img_dur=6),
+                "enemy/walk": Animation(load_images("entities/enemy/walk"), img_dur=4),
+                "player/idle": Animation(
+                    load_images("entities/player/idle"), img_dur=6
+                ),
+                "player/walk": Animation(
+                    load_images("entities/player/walk"), img_dur=4
+                ),
+                "player/jump": Animation(load_images("entities/player/jump")),
+                "particle/leaf": Animation(
+                    load_images("particles/leaf"), img_dur=20, loop=False
+                ),
+                "particle/particle": Animation(
+                    load_images("particles/particle"), img_dur=6, loop=False
+                ),
+                "gun": load_image("gun.png"),
+                "projectile": load_image("projectile.png"),
+            }
+        )
+
+        self.clouds = Clouds(self.assets["clouds"], count=16, rng=self.quality.random)
+        self.draw_queue = DrawQueue(self.display)
+
+        glow_size = self.assets["projectile"].get_width() + 8
+        self.projectile_glow = pygame.transform.scale(
+            self.assets["projectile"], (glow_size, glow_size)
+        )
+        self.projectile_glow.fill((255, 60, 60), special_flags=pygame.BLEND_RGB_MULT)
+        self.projectile_glow.set_alpha(90)
+
+    def load_audio(self):
+        self.audio = Audio()
+        self.audio.play_ambience()
+
+    def load_world(self, level=None):
         self.player = Player(self, (50, 50), (8, 15))
-        self.tilemap = Tilemap(self, tile_size=16)
 
         self.level = 0
         self.num_levels = 7
-        self.load_level(self.level)
-
+        self.prefetched = None
+        self.checkpoint = None
+        self.snapshots = SnapshotRing()
+        self.rewind_timer = 0
         self.screenshake = 0
-        self.start_time = pygame.time.get_ticks()
-        self.game_completed = False
-        self.completion_time = 0
-        self.show_start_screen = True
-        self.enemies_defeated = 0
-        self.blobs_defeated = 0
-
-    def load_level(self, map_id):
-        self.tilemap.load("data/maps/" + str(map_id) + ".json")
-
-        self.leaf_spawners = []
-        for tree in self.tilemap.extract([("large_decor", 2)], keep=True):
-            self.leaf_spawners.append(
-                pygame.Rect(4 + tree["pos"][0], 4 + tree["pos"][1], 23, 13)
+        self.load_level(self.level, level)
+
+    def finish_loading(self):
+        # The blocking version of load(), for tools that drive a Game
+        # without running its loop.
+        if self.loaded:
+            return
+        self.timed("howto", self.load_howto)
+        self.timed("assets", self.load_assets)
+        self.timed("audio", self.load_audio)
+        self.timed("map", self.load_world)
+        self.loaded = True
+        self.startup["ready"] = time.perf_counter() - STARTED
+
+    async def load(self):
+        self.timed("howto", self.load_howto)
+        await asyncio.sleep(0)
+        self.timed("assets", self.load_assets)
+        await asyncio.sleep(0)
+        self.timed("audio", self.load_audio)
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        level = None
+        if sys.platform != "emscripten":
+            level = await asyncio.to_thread(self.prepare_level, 0)
+        self.load_world(level)
+        self.startup["map"] = time.perf_counter() - start
+        self.loaded = True
+        self.startup["ready"] = time.perf_counter() - STARTED
+
+    def map_path(self, map_id):
+        path = "data/maps/" + str(map_id)
+        if is_world(path):
+            return path
+        return resolve_map(path) or path + BINARY_EXT
+
+    def prepare_level(self, map_id):
+        # Safe to run off the main thread: builds a fresh tilemap and entities
+        # without touching the live level.
+        path = self.map_path(map_id)
+        if is_world(path):
+            tilemap = open_tilemap(self, path, tile_size=16)
+            data = derive(tilemap, self.display.get_size())
+        else:
+            compiled = load_compiled(path)
+            tilemap = Tilemap(self, tile_size=16)
+            tilemap.load_data(compiled["map"])
+            data = compiled["level"]
+
+        level = {
+            "id": map_id,
+            "tilemap": tilemap,
+            "leaf_spawners": [pygame.Rect(rect) for rect in data["leaf_spawners"]],
+            "player_spawn_pos": data["player_spawn_pos"],
+            "enemies": [Enemy(self, pos, (8, 15)) for pos in data["enemies"]],
+            "blobs": [Blob(self, pos, (65, 65)) for pos in data["blobs"]],
+            "nav": data["nav"],
+        }
+        level["crowd"] = crowd_for(level["blobs"])
+        return level
+
+    def prefetch_level(self, map_id):
+        if map_id >= self.num_levels or sys.platform == "emscripten":
+            return
+        if self.prefetched is None or self.prefetched[0] != map_id:
+            self.prefetched = (
+                map_id,
+                asyncio.ensure_future(asyncio.to_thread(self.prepare_level, map_id)),
             )
 
-        self.enemies = []
-        self.blobs = []
-        for spawner in self.tilemap.extract(
-            [("spawners", 0), ("spawners", 1), ("spawners", 2)]
-        ):
-            if spawner["variant"] == 0:
-                self.player_spawn_pos = spawner["pos"]
-                self.player.pos = list(self.player_spawn_pos)
-                self.player.air_time = 0
-                self.player.health = self.player.maxhealth
-                self.player.ammo = self.player.max_ammo
-                self.player.dash_duration = 60
-            elif spawner["variant"] == 2:
-                self.blobs.append(Blob(self, spawner["pos"], (65, 65)))
-            else:
-                self.enemies.append(Enemy(self, spawner["pos"], (8, 15)))
-
-        self.projectiles = []
+    async def advance_level(self, map_id):
+        level = None
+        if self.prefetched is not None and self.prefetched[0] == map_id:
+            level = await self.prefetched[1]
+            self.prefetched = None
+        self.load_level(map_id, level)
+
+    def load_level(self, map_id, level=None):
+        if level is None:
+            level = self.prepare_level(map_id)
+
+        self.tilemap = level["tilemap"]
+        self.fall_limit = max(500, self.tilemap.bounds()[3] * self.tilemap.tile_size)
+        self.leaf_spawners = level["leaf_spawners"]
+        self.leaves = LeafEmitters(self, self.leaf_spawners)
+        self.enemies.reset(level["enemies"])
+        self.blobs.reset(level["blobs"])
+        self.crowd = level["crowd"]
+        self.nav = level["nav"]
+
+        if level["player_spawn_pos"] is not None:
+            self.player_spawn_pos = level["player_spawn_pos"]
+            self.player.pos = list(self.player_spawn_pos)
+            self.player.air_time = 0
+            self.player.health = self.player.maxhealth
+            self.player.ammo = self.player.max_ammo
+            self.player.dash_duration = 60
+
+        self.projectiles.reset()
         self.particles = []
-        self.sparks = []
-        self.float_particles = []
+        self.sparks.reset()
 
         self.scroll = [0, 0]
         self.dead = 0
@@ -114,6 +256,28 @@ class Game:
             self.enemies_defeated = 0
             self.blobs_defeated = 0
 
+        self.snapshots.clear()
+        self.rewind_timer = 0
+        if map_id == 0 and self.checkpoint is None:
+            self.checkpoint = (level, capture(self))
+
+    def restart(self):
+        # Back to the start of level 0 from the snapshot taken when it was
+        # first loaded, so the map is not parsed again.
+        self.level = 0
+        if self.checkpoint is None:
+            self.load_level(self.level)
+        else:
+            level, snapshot = self.checkpoint
+            self.load_level(self.level, level)
+            restore(self, snapshot)
+
+    def rewind(self):
+        snapshot = self.snapshots.rewind(REWIND_STEPS)
+        if snapshot is not None:
+            restore(self, snapshot)
+            self.rewind_timer = 0
+
     def respawn(self):
         self.player.health = max(0, self.player.health - 20)
         self.player.dash_duration = max(20, self.player.dash_duration - 10)
@@ -135,21 +299,27 @@ class Game:
         self.screen.blit(text_surf, pos)
 
     async def main(self):
+        loader = None
+        if not self.loaded:
+            loader = asyncio.ensure_future(self.load())
         running = True
         while running:
+            if loader is not None and loader.done():
+                loader.result()
+                loader = None
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
 
-                if self.show_start_screen or self.game_completed:
+                if self.show_start_screen or self.game_completed or not self.loaded:
                     if (
                         event.type == pygame.MOUSEBUTTONDOWN
                         or event.type == pygame.KEYDOWN
                     ):
                         if self.game_completed:
                             self.game_completed = False
-                            self.level = 0
-                            self.load_level(self.level)
+                            self.restart()
                         if self.show_start_screen:
                             self.show_start_screen = False
 
@@ -164,7 +334,8 @@ class Game:
                                     self.display.get_height() / self.screen.get_height()
                                 ),
                             )
-                            self.player.shoot(scaled_mouse_pos)
+                            if self.player.shoot(scaled_mouse_pos):
+                                self.audio.play("shoot")
                         if event.button == 3:
                             self.player.reload()
                     if event.type == pygame.KEYDOWN:
@@ -173,11 +344,17 @@ class Game:
                         if event.key == pygame.K_d:
                             self.movement[1] = True
                         if event.key == pygame.K_w:
-                            self.player.jump()
+                            if self.player.jump():
+                                self.audio.play("jump")
                         if event.key == pygame.K_SPACE or event.key == pygame.K_s:
-                            self.player.dash()
+                            if self.player.dash():
+                                self.audio.play("dash")
                         if event.key == pygame.K_r:
                             self.player.reload()
+                        if event.key == pygame.K_BACKSPACE:
+                            self.rewind()
+                        if event.key == pygame.K_F3:
+                            self.show_quality = not self.show_quality
                     if event.type == pygame.KEYUP:
                         if event.key == pygame.K_a:
                             self.movement[0] = False
@@ -220,7 +397,7 @@ class Game:
                     (200, 200, 200),
                 )
 
-            elif self.show_start_screen:
+            elif self.show_start_screen or not self.loaded:
                 try:
                     scaled_howto = pygame.transform.scale(
                         self.assets["howto"], self.screen.get_size()
@@ -240,12 +417,27 @@ class Game:
                         (self.screen.get_width() // 2 - 150, 400),
                         (200, 200, 200),
                     )
+                if not self.show_start_screen:
+                    self.render_text_with_outline(
+                        "Loading...",
+                        self.ui_font,
+                        (self.screen.get_width() // 2 - 40, 440),
+                        (255, 255, 255),
+                    )
 
             else:
+                self.quality.update(self.clock.get_rawtime())
+                self.prefetch_level(self.level + 1)
                 self.display.fill((0, 0, 0, 0))
                 self.display_2.blit(self.assets["background"], (0, 0))
                 self.screenshake = max(0, self.screenshake - 1)
 
+                if not self.dead:
+                    self.rewind_timer += 1
+                    if self.rewind_timer >= REWIND_INTERVAL:
+                        self.rewind_timer = 0
+                        self.snapshots.push(capture(self))
+
                 if not len(self.enemies) and not len(self.blobs) and not self.dead:
                     if self.level == self.num_levels - 1:
                         if not self.game_completed:
@@ -255,7 +447,7 @@ class Game:
                             )
                     else:
                         self.level = min(self.level + 1, self.num_levels - 1)
-                        self.load_level(self.level)
+                        await self.advance_level(self.level)
                         self.player.health = min(
                             self.player.maxhealth, self.player.health + 20
                         )
@@ -266,8 +458,7 @@ class Game:
                         if self.death_type == "fall":
                             self.respawn()
                         elif self.death_type == "health":
-                            self.level = 0
-                            self.load_level(self.level)
+                            self.restart()
 
                 self.scroll[0] += (
                     self.player.rect().centerx
@@ -281,57 +472,76 @@ class Game:
                 ) / 30
                 render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
                 self.camera_offset = render_scroll
+                self.tilemap.stream(
+                    self.display.get_rect(center=self.player.rect().center)
+                )
+                self.tilemap.clear_sight_cache()
 
-                for rect in self.leaf_spawners:
-                    if random.random() * 49999 < rect.width * rect.height:
-                        pos = (
-                            rect.x + random.random() * rect.width,
-                            rect.y + random.random() * rect.height,
-                        )
-                        self.particles.append(
-                            Particle(
-                                self,
-                                "leaf",
-                                pos,
-                                velocity=[-0.1, 0.3],
-                                frame=random.randint(0, 20),
-                            )
-                        )
+                self.leaves.update(
+                    pygame.Rect(render_scroll, self.display.get_size()),
+                    emit=self.quality.enabled("leaves"),
+                )
 
                 self.clouds.update()
+                self.clouds.step = 1 if self.quality.enabled("clouds") else 2
                 self.clouds.render(self.display_2, offset=render_scroll)
-                self.tilemap.render(self.display, offset=render_scroll)
+                entity_layer = self.draw_queue.layer(LAYER_ENTITIES)
+                self.tilemap.render(
+                    self.draw_queue.layer(LAYER_TILES), offset=render_scroll
+                )
 
-                for blob in self.blobs.copy():
-                    blob.update(self.player, self.tilemap, (0, 0))
-                    blob.render(self.display, offset=render_scroll)
+                active = [
+                    (handle, blob)
+                    for handle, blob in self.blobs.entries()
+                    if self.tilemap.is_loaded(blob.pos)
+                ]
+                active_blobs = [blob for handle, blob in active]
+                if self.crowd is not None:
+                    self.crowd.update(active_blobs, self.player)
+                else:
+                    for blob in active_blobs:
+                        blob.update(self.player, self.tilemap, (0, 0))
+                for handle, blob in active:
+                    blob.render(entity_layer, offset=render_scroll)
                     if blob.health <= 0:
-                        self.blobs.remove(blob)
+                        self.blobs.despawn(handle)
                         self.blobs_defeated += 1
-                        for i in range(10):
-                            angle = random.random() * math.pi * 2
+                        for i in range(self.quality.count(10)):
+                            angle = self.quality.random.random() * math.pi * 2
                             self.sparks.append(
-                                Spark(blob.rect().center, angle, 1 + random.random())
+                                Spark(
+                                    blob.rect().center,
+                                    angle,
+                                    1 + self.quality.random.random(),
+                                )
                             )
+                self.blobs.flush()
 
-                for enemy in self.enemies.copy():
+                for handle, enemy in self.enemies.entries():
+                    if not self.tilemap.is_loaded(enemy.pos):
+                        continue
                     enemy.update(self.tilemap, (0, 0))
-                    enemy.render(self.display, offset=render_scroll)
+                    enemy.render(entity_layer, offset=render_scroll)
                     if enemy.health <= 0:
-                        self.enemies.remove(enemy)
+                        self.enemies.despawn(handle)
                         self.enemies_defeated += 1
-                        for i in range(15):
-                            angle = random.random() * math.pi * 2
+                        for i in range(self.quality.count(15)):
+                            angle = self.quality.random.random() * math.pi * 2
                             self.sparks.append(
-                                Spark(enemy.rect().center, angle, 2 + random.random())
+                                Spark(
+                                    enemy.rect().center,
+                                    angle,
+                                    2 + self.quality.random.random(),
+                                )
                             )
+                self.enemies.flush()
 
                 if not self.dead:
                     self.player.update(
                         self.tilemap, (self.movement[1] - self.movement[0], 0)
                     )
-                    self.player.render(self.display, offset=render_scroll)
-                    if self.player.pos[1] > 500:
+                    self.player.render(entity_layer, offset=render_scroll)
+                    if self.player.pos[1] > self.fall_limit:
                         self.dead = 1
                         self.death_type = "fall"
                         self.screenshake = max(16, self.screenshake)
@@ -340,28 +550,24 @@ class Game:
                         self.death_type = "health"
                         self.screenshake = max(16, self.screenshake)
 
-                for projectile in self.projectiles.copy():
+                projectile_layer = self.draw_queue.layer(LAYER_PROJECTILES)
+                for handle, projectile in self.projectiles.entries():
                     projectile["pos"][0] += projectile["vel"][0]
                     projectile["pos"][1] += projectile["vel"][1]
                     projectile["timer"] = projectile.get("timer", 0) + 1
                     img = self.assets["projectile"]
                     render_pos_x = projectile["pos"][0] - render_scroll[0]
                     render_pos_y = projectile["pos"][1] - render_scroll[1]
-                    if projectile["owner"] == "enemy":
-                        glow_size = img.get_width() + 8
-                        glow_surf = pygame.transform.scale(img, (glow_size, glow_size))
-                        glow_surf.fill(
-                            (255, 60, 60), special_flags=pygame.BLEND_RGB_MULT
-                        )
-                        glow_surf.set_alpha(90)
-                        self.display.blit(
+                    if projectile["owner"] == "enemy" and self.quality.enabled("glow"):
+                        glow_surf = self.projectile_glow
+                        projectile_layer.blit(
                             glow_surf,
                             (
                                 render_pos_x - glow_surf.get_width() / 2,
                                 render_pos_y - glow_surf.get_height() / 2,
                             ),
                         )
-                    self.display.blit(
+                    projectile_layer.blit(
                         img,
                         (
                             render_pos_x - img.get_width() / 2,
@@ -369,52 +575,52 @@ class Game:
                         ),
                     )
                     if self.tilemap.solid_check(projectile["pos"]):
-                        if projectile in self.projectiles:
-                            self.projectiles.remove(projectile)
-                        for i in range(4):
+                        self.projectiles.despawn(handle)
+                        for i in range(self.quality.count(4)):
                             self.sparks.append(
                                 Spark(
                                     projectile["pos"],
-                                    random.random() - 0.5 + math.pi,
-                                    2 + random.random(),
+                                    self.quality.random.random() - 0.5 + math.pi,
+                                    2 + self.quality.random.random(),
                                 )
                             )
                     elif projectile["timer"] > 360:
-                        if projectile in self.projectiles:
-                            self.projectiles.remove(projectile)
+                        self.projectiles.despawn(handle)
                     if projectile["owner"] == "player":
                         hit = False
-                        for enemy in self.enemies.copy():
+                        for enemy in self.enemies:
                             if enemy.rect().collidepoint(projectile["pos"]):
                                 enemy.health -= 1
                                 enemy.hit_timer = 60
-                                for i in range(4):
+                                self.audio.play("hit")
+                                for i in range(self.quality.count(4)):
                                     self.sparks.append(
                                         Spark(
                                             projectile["pos"],
-                                            random.random() * math.pi * 2,
-                                            1 + random.random(),
+                                            self.quality.random.random() * math.pi * 2,
+                                            1 + self.quality.random.random(),
                                         )
                                     )
-                                if projectile in self.projectiles:
-                                    self.projectiles.remove(projectile)
+                                self.projectiles.despawn(handle)
                                 hit = True
                                 break
                         if not hit:
-                            for blob in self.blobs.copy():
+                            for blob in self.blobs:
                                 if blob.rect().collidepoint(projectile["pos"]):
                                     blob.health -= 1
                                     blob.hit_timer = 90
-                                    for i in range(4):
+                                    self.audio.play("hit")
+                                    for i in range(self.quality.count(4)):
                                         self.sparks.append(
                                             Spark(
                                                 projectile["pos"],
-                                                random.random() * math.pi * 2,
-                                                1 + random.random(),
+                                                self.quality.random.random()
+                                                * math.pi
+                                                * 2,
+                                                1 + self.quality.random.random(),
                                             )
                                         )
-                                    if projectile in self.projectiles:
-                                        self.projectiles.remove(projectile)
+                                    self.projectiles.despawn(handle)
                                     break
                     elif projectile["owner"] == "enemy":
                         if (
@@ -423,38 +629,42 @@ class Game:
                             < self.player.dash_duration - 10
                         ):
                             if self.player.rect().collidepoint(projectile["pos"]):
-                                if projectile in self.projectiles:
-                                    self.projectiles.remove(projectile)
+                                self.projectiles.despawn(handle)
                                 self.player.health = max(0, self.player.health - 20)
+                                self.audio.play("player_hit")
                                 self.screenshake = max(16, self.screenshake)
+                self.projectiles.flush()
 
-                for spark in self.sparks.copy():
+                self.draw_queue.flush()
+
+                for handle, spark in self.sparks.entries():
                     kill = spark.update()
                     spark.render(self.display, offset=render_scroll)
                     if kill:
-                        self.sparks.remove(spark)
+                        self.sparks.despawn(handle)
+                self.sparks.flush()
 
-                display_mask = pygame.mask.from_surface(self.display)
-                display_sillhouette = display_mask.to_surface(
-                    setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0)
-                )
-                for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    self.display_2.blit(display_sillhouette, offset)
-
-                for particle in self.particles.copy():
-                    kill = particle.update()
-                    particle.render(self.display, offset=render_scroll)
-                    if particle.type == "leaf":
-                        particle.pos[0] += (
-                            math.sin(particle.animation.frame * 0.035) * 0.3
-                        )
-                    if kill:
-                        self.particles.remove(particle)
+                if self.quality.enabled("outline"):
+                    display_mask = pygame.mask.from_surface(self.display)
+                    display_sillhouette = display_mask.to_surface(
+                        setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0)
+                    )
+                    for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                        self.display_2.blit(display_sillhouette, offset)
+
+                particle_layer = self.draw_queue.layer(LAYER_PARTICLES)
+                alive_particles = update_particles(self.particles)
+                for particle in self.particles:
+                    particle.render(particle_layer, offset=render_scroll)
+                self.particles = alive_particles
+                self.leaves.render(particle_layer, offset=render_scroll)
+                self.draw_queue.flush()
 
                 self.display_2.blit(self.display, (0, 0))
+                fx_random = self.quality.random
                 screenshake_offset = (
-                    random.random() * self.screenshake - self.screenshake / 2,
-                    random.random() * self.screenshake - self.screenshake / 2,
+                    fx_random.random() * self.screenshake - self.screenshake / 2,
+                    fx_random.random() * self.screenshake - self.screenshake / 2,
                 )
                 self.screen.blit(
                     pygame.transform.scale(self.display_2, self.screen.get_size()),
@@ -514,6 +724,13 @@ class Game:
                 self.render_text_with_outline(
                     timer_str, self.ui_font, timer_rect.topleft, (255, 255, 255)
                 )
+                if self.show_quality:
+                    self.render_text_with_outline(
+                        self.quality.summary(),
+                        self.ui_font,
+                        (10, 85),
+                        (255, 255, 0),
+                    )
                 if self.player.ammo == 0:
                     reload_str = "PRESS R TO RELOAD (-20 HP)"
                     reload_rect = self.ui_font.render(
@@ -529,6 +746,8 @@ class Game:
                     )
 
             pygame.display.update()
+            if "first_frame" not in self.startup:
+                self.startup["first_frame"] = time.perf_counter() - STARTED
             self.clock.tick(60)
             await asyncio.sleep(0)
 
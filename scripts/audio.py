@@ -0,0 +1,110 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+SFX_PATH = "data/sfx/"
+AMBIENCE = "ambience.mp3"
+AMBIENCE_VOLUME = 0.4
+CHANNELS = 16
+
+# name: (file, volume, max voices, priority)
+EFFECTS = {
+    "jump": ("jump.mp3", 0.7, 1, 2),
+    "dash": ("dash.mp3", 0.5, 1, 2),
+    "shoot": ("shoot.mp3", 0.5, 2, 2),
+    "hit": ("hit.mp3", 0.7, 3, 3),
+    "player_hit": ("hit.mp3", 1.0, 1, 4),
+    "enemy_shoot": ("shoot.mp3", 0.25, 3, 1),
+}
+
+
+def decode(names):
+    return {name: pygame.mixer.Sound(SFX_PATH + name) for name in names}
+
+
+class Audio:
+    # Fixed pool of mixer channels. Each effect has a voice limit: once it is
+    # reached the effect's oldest voice is restarted. When every channel is
+    # busy, the oldest voice with a lower priority is stolen, otherwise the new
+    # sound is dropped. Effects play nothing until they have been decoded.
+    def __init__(self, enabled=True, channels=CHANNELS):
+        self.enabled = False
+        self.sounds = {}
+        self.loading = None
+        self.voices = []
+        self.plays = 0
+        if not enabled:
+            return
+
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+        except pygame.error:
+            return
+        self.enabled = True
+
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.voices = [None] * channels
+
+        files = sorted({effect[0] for effect in EFFECTS.values()})
+        if sys.platform == "emscripten":
+            self.sounds = decode(files)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sfx")
+            self.loading = executor.submit(decode, files)
+            executor.shutdown(wait=False)
+
+    def ready(self):
+        if self.loading is not None and self.loading.done():
+            self.sounds = self.loading.result()
+            self.loading = None
+        return bool(self.sounds)
+
+    def play_ambience(self):
+        if not self.enabled:
+            return
+        try:
+            pygame.mixer.music.load(SFX_PATH + AMBIENCE)
+        except pygame.error:
+            return
+        pygame.mixer.music.set_volume(AMBIENCE_VOLUME)
+        pygame.mixer.music.play(-1)
+
+    def pick_channel(self, name, max_voices, priority):
+        same = []
+        free = None
+        steal = None
+        for i, channel in enumerate(self.channels):
+            voice = self.voices[i]
+            if voice is None or not channel.get_busy():
+                if free is None:
+                    free = i
+                continue
+            if voice[0] == name:
+                same.append(i)
+            if voice[1] < priority and (
+                steal is None or voice[2] < self.voices[steal][2]
+            ):
+                steal = i
+
+        if len(same) >= max_voices:
+            return min(same, key=lambda i: self.voices[i][2])
+        if free is not None:
+            return free
+        return steal
+
+    def play(self, name):
+        if not self.enabled or not self.ready():
+            return
+        file, volume, max_voices, priority = EFFECTS[name]
+        index = self.pick_channel(name, max_voices, priority)
+        if index is None:
+            return
+
+        channel = self.channels[index]
+        channel.play(self.sounds[file])
+        channel.set_volume(volume)
+        self.plays += 1
+        self.voices[index] = (name, priority, self.plays)
@@ -0,0 +1,45 @@
+import time
+
+from scripts.mapfile import io_executor
+
+AUTOSAVE_INTERVAL = 30.0
+
+
+class Autosaver:
+    def __init__(self, tilemap, path, interval=AUTOSAVE_INTERVAL):
+        self.tilemap = tilemap
+        self.path = path
+        self.interval = interval
+        self.saved_revision = tilemap.revision
+        self.last_save = time.monotonic()
+        self.future = None
+        # The last save's exception, or None once a save succeeds. Set on the
+        # io worker and read by the editor to show in its caption.
+        self.error = None
+
+    def busy(self):
+        return self.future is not None and not self.future.done()
+
+    def save(self, path=None):
+        # The snapshot is taken here on the calling thread; serializing and
+        # writing happen on the map io worker.
+        self.future = io_executor().submit(self.tilemap.save_job(path or self.path))
+        self.future.add_done_callback(self.report)
+        if path is None or path == self.path:
+            self.saved_revision = self.tilemap.revision
+        self.last_save = time.monotonic()
+
+    def report(self, future):
+        self.error = future.exception()
+
+    def update(self):
+        if (
+            self.tilemap.revision != self.saved_revision
+            and time.monotonic() - self.last_save >= self.interval
+            and not self.busy()
+        ):
+            self.save()
+
+    def flush(self):
+        if self.future is not None:
+            self.future.exception()
@@ -0,0 +1,398 @@
+import json
+import os
+import shutil
+import sys
+
+from scripts.mapfile import (
+    BINARY_EXT,
+    atomic_open,
+    io_executor,
+    read_binary,
+    read_map,
+    write_binary,
+    write_map,
+)
+from scripts.tilemap import Tilemap
+
+# A chunked world is a directory holding a manifest plus one binary map file
+# per non-empty chunk, named "<cx>_<cy>.map". Spawners and trees are copied
+# into the manifest so a level can be set up without loading every chunk.
+MANIFEST = "world.json"
+VERSION = 1
+CHUNK_SIZE = 32
+MAX_CHUNKS = 64
+MARKER_TYPES = {"spawners", "large_decor"}
+
+
+def is_world(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def chunk_file(path, chunk):
+    return os.path.join(path, str(chunk[0]) + "_" + str(chunk[1]) + BINARY_EXT)
+
+
+def write_chunk(path, tile_size, tilemap, offgrid):
+    if tilemap or offgrid:
+        write_binary(
+            path, {"tilemap": tilemap, "tile_size": tile_size, "offgrid": offgrid}
+        )
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def open_tilemap(game, path, tile_size=16):
+    if is_world(path):
+        tilemap = ChunkedTilemap(game, tile_size=tile_size)
+    else:
+        tilemap = Tilemap(game, tile_size=tile_size)
+    tilemap.load(path)
+    return tilemap
+
+
+class ChunkedTilemap(Tilemap):
+    def __init__(self, game, tile_size=16, max_chunks=MAX_CHUNKS):
+        super().__init__(game, tile_size=tile_size)
+        self.max_chunks = max_chunks
+        self.path = None
+        self.chunk_size = CHUNK_SIZE
+        self.world_bounds = (0, 0, 0, 0)
+        self.markers = {"grid": [], "offgrid": []}
+        self.available = set()
+        self.chunks = set()
+        self.pending = {}
+        self.dirty = set()
+        self.extracted = set()
+
+    def load(self, path):
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            manifest = json.load(f)
+        if manifest["version"] != VERSION:
+            raise ValueError(f"{path} has unsupported world version")
+
+        self.path = path
+        self.tile_size = manifest["tile_size"]
+        self.chunk_size = manifest["chunk_size"]
+        self.world_bounds = tuple(manifest["bounds"])
+        self.markers = manifest["markers"]
+        self.available = {tuple(chunk) for chunk in manifest["chunks"]}
+
+        self.tilemap = {}
+        self.offgrid_tiles = []
+        self.build_index()
+        self.chunks = set()
+        self.pending = {}
+        self.dirty = set()
+        self.extracted = set()
+
+    def save_job(self, path=None):
+        # Only dirty chunks are snapshotted and rewritten, plus the manifest.
+        if path is not None and path != self.path:
+            io_executor().submit(lambda: None).result()
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            shutil.copytree(self.path, path)
+            self.path = path
+
+        writes = [self.chunk_snapshot(chunk) for chunk in list(self.dirty)]
+        manifest_path = os.path.join(self.path, MANIFEST)
+        manifest = {
+            "version": VERSION,
+            "tile_size": self.tile_size,
+            "chunk_size": self.chunk_size,
+            "bounds": list(self.world_bounds),
+            "chunks": sorted(self.available),
+            "markers": dict(self.markers),
+        }
+
+        def job():
+            for write in writes:
+                write_chunk(*write)
+            with atomic_open(manifest_path, "w") as f:
+                json.dump(manifest, f)
+
+        return job
+
+    def save(self, path=None):
+        io_executor().submit(self.save_job(path)).result()
+
+    def chunk_of(self, loc):
+        return (loc[0] // self.chunk_size, loc[1] // self.chunk_size)
+
+    def chunk_of_pixel(self, pos):
+        span = self.chunk_size * self.tile_size
+        return (int(pos[0] // span), int(pos[1] // span))
+
+    def chunk_cells(self, chunk):
+        for x in range(chunk[0] * self.chunk_size, (chunk[0] + 1) * self.chunk_size):
+            for y in range(
+                chunk[1] * self.chunk_size, (chunk[1] + 1) * self.chunk_size
+            ):
+                yield (x, y)
+
+    def chunk_tiles(self, chunk):
+        tilemap = {}
+        for loc in self.chunk_cells(chunk):
+            if loc in self.tilemap:
+                tilemap[loc] = self.tilemap[loc]
+        offgrid = [
+            tile
+            for tile in self.offgrid_tiles
+            if self.chunk_of_pixel(tile["pos"]) == chunk
+        ]
+        return tilemap, offgrid
+
+    def _touch(self, chunk):
+        # An edit to a chunk that is on disk but not resident must land on top
+        # of its tiles, or saving the chunk would write out only the edit. The
+        # read goes through the io executor so it sees any queued write.
+        if chunk in self.available and chunk not in self.chunks:
+            future = self.pending.pop(chunk, None)
+            if future is None:
+                future = io_executor().submit(self._read_chunk, self.path, chunk)
+            self._merge(chunk, future.result())
+        self.chunks.add(chunk)
+        self.dirty.add(chunk)
+
+    def set_tile(self, loc, tile_type, variant):
+        self._touch(self.chunk_of(loc))
+        return super().set_tile(loc, tile_type, variant)
+
+    def set_variant(self, loc, variant):
+        self._touch(self.chunk_of(loc))
+        super().set_variant(loc, variant)
+
+    def remove_tile(self, loc):
+        tile = super().remove_tile(loc)
+        if tile is not None:
+            self._touch(self.chunk_of(loc))
+        return tile
+
+    def _write(self, changes):
+        # Touches each edited chunk once, for the cells set_tile and
+        # remove_tile would have touched.
+        chunks = {
+            self.chunk_of(loc)
+            for loc, state in changes.items()
+            if state is not None or loc in self.tilemap
+        }
+        for chunk in chunks:
+            self._touch(chunk)
+        super()._write(changes)
+
+    def add_offgrid(self, tile):
+        self._touch(self.chunk_of_pixel(tile["pos"]))
+        super().add_offgrid(tile)
+
+    def remove_offgrid(self, tile):
+        self._touch(self.chunk_of_pixel(tile["pos"]))
+        super().remove_offgrid(tile)
+
+    def extract(self, id_pairs, keep=False):
+        id_pairs = set(id_pairs)
+        matches = []
+        for tile in self.markers["offgrid"]:
+            if (tile["type"], tile["variant"]) in id_pairs:
+                matches.append(tile.copy())
+                matches[-1]["pos"] = tile["pos"].copy()
+
+        for tile in self.markers["grid"]:
+            if (tile["type"], tile["variant"]) in id_pairs:
+                matches.append(tile.copy())
+                matches[-1]["pos"] = [
+                    tile["pos"][0] * self.tile_size,
+                    tile["pos"][1] * self.tile_size,
+                ]
+
+        if not keep:
+            # Extracted tiles are dropped from loaded chunks now and from the
+            # rest as they stream in, without marking anything dirty.
+            self.extracted |= id_pairs
+            for id_pair in id_pairs:
+                for loc in self.locations(id_pair):
+                    Tilemap.remove_tile(self, loc)
+
+        return matches
+
+    def bounds(self):
+        return self.world_bounds
+
+    def is_loaded(self, pos):
+        chunk = self.chunk_of_pixel(pos)
+        return chunk in self.chunks or chunk not in self.available
+
+    def fully_loaded(self):
+        return self.available <= self.chunks
+
+    def _read_chunk(self, path, chunk):
+        return read_binary(chunk_file(path, chunk))
+
+    def _merge(self, chunk, map_data):
+        self.chunks.add(chunk)
+        for loc, tile in map_data["tilemap"].items():
+            if loc in self.tilemap:
+                continue
+            if (tile["type"], tile["variant"]) in self.extracted:
+                continue
+            self.tilemap[loc] = tile
+            self._index(loc, tile)
+        for tile in map_data["offgrid"]:
+            Tilemap.add_offgrid(self, tile)
+
+    def unload_chunk(self, chunk):
+        if chunk in self.dirty:
+            io_executor().submit(write_chunk, *self.chunk_snapshot(chunk))
+        self.chunks.discard(chunk)
+
+        for loc in self.chunk_cells(chunk):
+            tile = self.tilemap.pop(loc, None)
+            if tile is not None:
+                self._unindex(loc, tile)
+        self.offgrid_tiles = [
+            tile
+            for tile in self.offgrid_tiles
+            if self.chunk_of_pixel(tile["pos"]) != chunk
+        ]
+        self.build_offgrid_index()
+
+    def chunk_snapshot(self, chunk):
+        self.dirty.discard(chunk)
+        tilemap, offgrid = self.chunk_tiles(chunk)
+
+        # Refresh this chunk's markers so the manifest stays complete.
+        for kind, tiles, to_chunk in (
+            ("grid", tilemap.values(), self.chunk_of),
+            ("offgrid", offgrid, self.chunk_of_pixel),
+        ):
+            self.markers[kind] = [
+                tile for tile in self.markers[kind] if to_chunk(tile["pos"]) != chunk
+            ] + [
+                {
+                    "type": tile["type"],
+                    "variant": tile["variant"],
+                    "pos": list(tile["pos"]),
+                }
+                for tile in tiles
+                if tile["type"] in MARKER_TYPES
+            ]
+
+        if tilemap or offgrid:
+            self.available.add(chunk)
+            for loc in tilemap:
+                self.world_bounds = (
+                    min(self.world_bounds[0], loc[0]),
+                    min(self.world_bounds[1], loc[1]),
+                    max(self.world_bounds[2], loc[0]),
+                    max(self.world_bounds[3], loc[1]),
+                )
+        else:
+            self.available.discard(chunk)
+        return (chunk_file(self.path, chunk), self.tile_size, tilemap, offgrid)
+
+    def stream(self, rect, block=False):
+        # Keep every chunk touching rect (plus a one-chunk margin) loaded,
+        # read missing ones on the loader thread and evict the farthest
+        # chunks once more than max_chunks are resident.
+        span = self.chunk_size * self.tile_size
+        wanted = set()
+        for cx in range(rect.left // span - 1, rect.right // span + 2):
+            for cy in range(rect.top // span - 1, rect.bottom // span + 2):
+                wanted.add((cx, cy))
+
+        for chunk in wanted & self.available:
+            if chunk not in self.chunks and chunk not in self.pending:
+                self.pending[chunk] = io_executor().submit(
+                    self._read_chunk, self.path, chunk
+                )
+
+        for chunk, future in list(self.pending.items()):
+            if block and chunk in wanted:
+                future.result()
+            if future.done():
+                del self.pending[chunk]
+                if chunk not in self.chunks:
+                    self._merge(chunk, future.result())
+
+        if len(self.chunks) > self.max_chunks:
+            center = (rect.centerx // span, rect.centery // span)
+            evictable = sorted(
+                self.chunks - wanted,
+                key=lambda c: (c[0] - center[0]) ** 2 + (c[1] - center[1]) ** 2,
+            )
+            for chunk in evictable[: len(self.chunks) - self.max_chunks]:
+                self.unload_chunk(chunk)
+
+
+def split_map(src, dst, chunk_size=CHUNK_SIZE):
+    map_data = read_map(src)
+    tile_size = map_data["tile_size"]
+    span = chunk_size * tile_size
+
+    chunks = {}
+    markers = {"grid": [], "offgrid": []}
+    for loc, tile in map_data["tilemap"].items():
+        chunk = (loc[0] // chunk_size, loc[1] // chunk_size)
+        chunks.setdefault(chunk, ({}, []))[0][loc] = tile
+        if tile["type"] in MARKER_TYPES:
+            markers["grid"].append(tile)
+    for tile in map_data["offgrid"]:
+        chunk = (int(tile["pos"][0] // span), int(tile["pos"][1] // span))
+        chunks.setdefault(chunk, ({}, []))[1].append(tile)
+        if tile["type"] in MARKER_TYPES:
+            markers["offgrid"].append(tile)
+
+    os.makedirs(dst, exist_ok=True)
+    for chunk, (tilemap, offgrid) in chunks.items():
+        write_binary(
+            chunk_file(dst, chunk),
+            {"tilemap": tilemap, "tile_size": tile_size, "offgrid": offgrid},
+        )
+
+    xs = [loc[0] for loc in map_data["tilemap"]] or [0]
+    ys = [loc[1] for loc in map_data["tilemap"]] or [0]
+    with open(os.path.join(dst, MANIFEST), "w") as f:
+        json.dump(
+            {
+                "version": VERSION,
+                "tile_size": tile_size,
+                "chunk_size": chunk_size,
+                "bounds": [min(xs), min(ys), max(xs), max(ys)],
+                "chunks": sorted(chunks),
+                "markers": markers,
+            },
+            f,
+        )
+
+
+def join_world(src, dst):
+    with open(os.path.join(src, MANIFEST), "r") as f:
+        manifest = json.load(f)
+
+    tilemap = {}
+    offgrid = []
+    for chunk in manifest["chunks"]:
+        map_data = read_binary(chunk_file(src, chunk))
+        tilemap.update(map_data["tilemap"])
+        offgrid += map_data["offgrid"]
+    write_map(
+        dst,
+        {"tilemap": tilemap, "tile_size": manifest["tile_size"], "offgrid": offgrid},
+    )
+
+
+# ==============================================================================
+# Usage:
+#   python -m scripts.chunks data/maps/3.map worlds/3 [chunk_size]   split
+#   python -m scripts.chunks worlds/3 3.map                          join
+# ==============================================================================
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) >= 2 and is_world(args[0]):
+        join_world(args[0], args[1])
+    elif len(args) in {2, 3}:
+        split_map(args[0], args[1], int(args[2]) if len(args) == 3 else CHUNK_SIZE)
+    else:
+        print("usage: python -m scripts.chunks <map> <world dir> [chunk size]")
+        print("       python -m scripts.chunks <world dir> <map>")
+        sys.exit(1)
+    print(f"{args[0]} -> {args[1]}")
@@ -1,6 +1,8 @@
 import random
 
 class Cloud:
+    __slots__ = ('pos', 'img', 'speed', 'depth')
+    
     def __init__(self, pos, img, speed, depth):
         self.pos = list(pos)
         self.img = img
@@ -11,15 +13,19 @@ class Cloud:
         self.pos[0] += self.speed
         
     def render(self, surf, offset=(0, 0)):
+        surf.blit(*self.command(surf.get_size(), offset))
+    
+    def command(self, size, offset=(0, 0)):
         render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
-        surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(), render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
+        return self.img, (render_pos[0] % (size[0] + self.img.get_width()) - self.img.get_width(), render_pos[1] % (size[1] + self.img.get_height()) - self.img.get_height())
         
 class Clouds:
-    def __init__(self, cloud_images, count=16):
+    def __init__(self, cloud_images, count=16, rng=random):
         self.clouds = []
+        self.step = 1
         
         for i in range(count):
-            self.clouds.append(Cloud((random.random() * 99999, random.random() * 99999), random.choice(cloud_images), random.random() * 0.05 + 0.05, random.random() * 0.6 + 0.2))
+            self.clouds.append(Cloud((rng.random() * 99999, rng.random() * 99999), rng.choice(cloud_images), rng.random() * 0.05 + 0.05, rng.random() * 0.6 + 0.2))
         
         self.clouds.sort(key=lambda x: x.depth)
     
@@ -28,5 +34,5 @@ class Clouds:
             cloud.update()
     
     def render(self, surf, offset=(0, 0)):
-        for cloud in self.clouds:
-            cloud.render(surf, offset=offset)
\ No newline at end of file
+        size = surf.get_size()
+        surf.blits([cloud.command(size, offset=offset) for cloud in self.clouds[::self.step]], doreturn=False)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from scripts.entities import (
+    INACCURACY_FREQUENCY,
+    MAX_INACCURACY,
+    WAVE_AMPLITUDE,
+    WAVE_FREQUENCY,
+)
+
+# Below this many blobs the per-instance path is cheaper than the arrays.
+CROWD_MIN = 16
+
+
+def crowd_for(blobs):
+    if np is None or len(blobs) < CROWD_MIN:
+        return None
+    return BlobCrowd(blobs)
+
+
+class BlobCrowd:
+    # Struct-of-arrays store for a level's blobs. While a blob belongs to a
+    # crowd its pos is a row view into self.pos and its AI timers live here;
+    # sync() copies them back onto the objects when they are needed there.
+    def __init__(self, blobs):
+        self.blobs = list(blobs)
+        count = len(self.blobs)
+
+        def column(name):
+            return np.array([getattr(blob, name) for blob in self.blobs], dtype=float)
+
+        self.pos = np.array([blob.pos for blob in self.blobs], dtype=float)
+        self.pos = self.pos.reshape(count, 2)
+        self.idle_movement = np.array(
+            [blob.idle_movement for blob in self.blobs], dtype=float
+        ).reshape(count, 2)
+        self.shoot_cooldown = column("shoot_cooldown")
+        self.chase_timer = column("chase_timer")
+        self.idle_timer = column("idle_timer")
+        self.speed = column("speed")
+        self.aggro_distance = column("aggro_distance")
+        self.shoot_delay = column("shoot_delay")
+        self.chase = np.zeros(count, dtype=bool)
+        self.flip = np.array([blob.flip for blob in self.blobs], dtype=bool)
+
+        for slot, blob in enumerate(self.blobs):
+            blob.slot = slot
+            blob.pos = self.pos[slot]
+
+    def sync(self):
+        for slot, blob in enumerate(self.blobs):
+            blob.shoot_cooldown = float(self.shoot_cooldown[slot])
+            blob.chase_timer = int(self.chase_timer[slot])
+            blob.idle_timer = int(self.idle_timer[slot])
+            blob.idle_movement = tuple(self.idle_movement[slot].tolist())
+            blob.state = "chase" if self.chase[slot] else "idle"
+
+    def update(self, blobs, player):
+        # Batched Blob.think + Blob.move for the given subset of the crowd.
+        count = len(blobs)
+        if not count:
+            return
+        slots = np.fromiter((blob.slot for blob in blobs), dtype=int, count=count)
+        hit_timer = np.fromiter(
+            (blob.hit_timer for blob in blobs), dtype=float, count=count
+        )
+        pos = self.pos[slots]
+        speed = self.speed[slots]
+        cooldown = self.shoot_cooldown[slots]
+        chase_timer = self.chase_timer[slots]
+        idle_timer = self.idle_timer[slots]
+        idle_movement = self.idle_movement[slots]
+
+        player_rect = player.rect()
+        shoot_dx = player_rect.centerx - pos[:, 0]
+        shoot_dy = player_rect.centery - pos[:, 1]
+
+        hit_timer = np.where(hit_timer > 0, hit_timer - 1, hit_timer)
+        chase = (np.hypot(shoot_dx, shoot_dy) < self.aggro_distance[slots]) | (
+            hit_timer > 0
+        )
+        idle = ~chase
+
+        cooldown = np.where(chase & (cooldown > 0), cooldown - 0.5, cooldown)
+        moving = chase & (cooldown > 0)
+        firing = chase & ~moving
+
+        vel = np.zeros_like(pos)
+        angle = np.arctan2(shoot_dy[moving] - 50, shoot_dx[moving])
+        offset = np.sin(chase_timer[moving] * WAVE_FREQUENCY) * WAVE_AMPLITUDE
+        cos, sin = np.cos(angle), np.sin(angle)
+        vel[moving, 0] = cos * speed[moving] - sin * offset
+        vel[moving, 1] = sin * speed[moving] + cos * offset
+        chase_timer = chase_timer + moving
+
+        fire_angles = np.arctan2(shoot_dy[firing], shoot_dx[firing]) + (
+            np.sin(chase_timer[firing] * INACCURACY_FREQUENCY) * MAX_INACCURACY
+        )
+        cooldown[firing] = self.shoot_delay[slots][firing]
+
+        idle_timer = idle_timer - idle
+        reset = idle & (idle_timer <= 0)
+        resets = int(reset.sum())
+        if resets:
+            idle_timer[reset] = np.random.randint(60, 121, resets)
+            random_angle = np.random.uniform(0, 2 * math.pi, resets)
+            idle_speed = speed[reset] * 0.5
+            idle_movement[reset, 0] = np.cos(random_angle) * idle_speed
+            idle_movement[reset, 1] = np.sin(random_angle) * idle_speed
+        vel[idle] = idle_movement[idle]
+
+        self.pos[slots] = pos + vel
+        self.shoot_cooldown[slots] = cooldown
+        self.chase_timer[slots] = chase_timer
+        self.idle_timer[slots] = idle_timer
+        self.idle_movement[slots] = idle_movement
+        self.chase[slots] = chase
+
+        for blob, hit in zip(blobs, hit_timer.astype(int).tolist()):
+            blob.hit_timer = hit
+        for index, angle in zip(np.flatnonzero(firing).tolist(), fire_angles.tolist()):
+            blobs[index].fire(angle)
+
+        flip = np.where(vel[:, 0] > 0, False, self.flip[slots])
+        flip[vel[:, 0] < 0] = True
+        for index in np.flatnonzero(flip != self.flip[slots]).tolist():
+            blobs[index].flip = bool(flip[index])
+        self.flip[slots] = flip
+
+        for blob in blobs:
+            blob.frame = blob.animation.advance(blob.frame)
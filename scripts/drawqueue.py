@@ -0,0 +1,51 @@
+LAYER_TILES = 0
+LAYER_ENTITIES = 1
+LAYER_PROJECTILES = 2
+LAYER_PARTICLES = 3
+
+
+class DrawLayer:
+    # Stands in for the target surface in render(surf, offset) methods: blit
+    # and blits record commands instead of drawing, and the size queries are
+    # answered from the real target.
+    __slots__ = ("commands", "target")
+
+    def __init__(self, target):
+        self.commands = []
+        self.target = target
+
+    def blit(self, img, pos):
+        self.commands.append((img, pos))
+
+    def blits(self, commands, doreturn=False):
+        self.commands.extend(commands)
+
+    def get_width(self):
+        return self.target.get_width()
+
+    def get_height(self):
+        return self.target.get_height()
+
+    def get_size(self):
+        return self.target.get_size()
+
+
+class DrawQueue:
+    # Collects blits for a surface by layer and submits each layer with a
+    # single Surface.blits call, lowest layer first. Within a layer commands
+    # keep the order they were queued in.
+    def __init__(self, target):
+        self.target = target
+        self.layers = {}
+
+    def layer(self, index):
+        if index not in self.layers:
+            self.layers[index] = DrawLayer(self.target)
+        return self.layers[index]
+
+    def flush(self):
+        for index in sorted(self.layers):
+            commands = self.layers[index].commands
+            if commands:
+                self.target.blits(commands, doreturn=False)
+                commands.clear()
@@ -3,9 +3,14 @@ import sys
 import pygame
 
 from scripts.utils import load_images
-from scripts.tilemap import Tilemap
+from scripts.tilemap import AUTOTILE_TYPES, FLOOD_LIMIT, Tilemap, collector_paused
+from scripts.mapfile import BINARY_EXT, JSON_EXT, resolve_map
+from scripts.chunks import ChunkedTilemap, is_world
+from scripts.history import EditHistory
+from scripts.autosave import Autosaver
 
 RENDER_SCALE = 2.0
+MAP_PATH = "map"
 
 
 class Editor:
@@ -28,12 +33,20 @@ class Editor:
 
         self.movement = [False, False, False, False]
 
-        self.tilemap = Tilemap(self, tile_size=16)
+        if is_world(MAP_PATH):
+            self.tilemap = ChunkedTilemap(self, tile_size=16)
+            self.tilemap.load(MAP_PATH)
+            save_path = MAP_PATH
+        else:
+            self.tilemap = Tilemap(self, tile_size=16)
+            path = resolve_map(MAP_PATH)
+            if path:
+                self.tilemap.load(path)
+            save_path = MAP_PATH + BINARY_EXT
 
-        try:
-            self.tilemap.load("map.json")
-        except FileNotFoundError:
-            pass
+        self.history = EditHistory(self.tilemap)
+        self.autosaver = Autosaver(self.tilemap, save_path)
+        self.previews = {}
 
         self.scroll = [0, 0]
 
@@ -45,6 +58,77 @@ class Editor:
         self.right_clicking = False
         self.shift = False
         self.ongrid = True
+        self.autotiling = True
+        self.caption = ""
+        self.notice = ""
+
+        self.tool = "brush"
+        self.drag_start = None
+        self.clipboard = None
+
+    def preview(self, tile_type, variant):
+        if (tile_type, variant) not in self.previews:
+            img = self.assets[tile_type][variant].copy()
+            img.set_alpha(100)
+            self.previews[(tile_type, variant)] = img
+        return self.previews[(tile_type, variant)]
+
+    def affected(self, locs):
+        if not self.autotiling:
+            return locs
+        return list(locs) + list(self.tilemap.border(locs))
+
+    def apply_changes(self, changes, offgrid=()):
+        # Bulk tools land as one undo step, autotiling only the edited area.
+        # Like flood fill, they leave cells in chunks that haven't streamed in
+        # alone rather than pulling chunks in behind the view.
+        self.notice = ""
+        if not self.tilemap.fully_loaded():
+            size = self.tilemap.tile_size
+            loaded = {
+                loc: state
+                for loc, state in changes.items()
+                if self.tilemap.is_loaded((loc[0] * size, loc[1] * size))
+            }
+            offgrid = [tile for tile in offgrid if self.tilemap.is_loaded(tile["pos"])]
+            skipped = len(changes) - len(loaded)
+            if skipped:
+                self.notice = f"skipped {skipped} unloaded cells"
+            changes = loaded
+
+        with collector_paused():
+            border = self.tilemap.border(changes) if self.autotiling else ()
+            self.history.touch(changes)
+            self.history.touch(border)
+            self.tilemap.apply(changes, autotile=self.autotiling, border=border)
+            for tile in offgrid:
+                self.tilemap.add_offgrid(tile)
+                self.history.record_offgrid(tile, True)
+            self.history.end()
+
+    def drag_rect(self, end):
+        top_left = (min(self.drag_start[0], end[0]), min(self.drag_start[1], end[1]))
+        bottom_right = (
+            max(self.drag_start[0], end[0]),
+            max(self.drag_start[1], end[1]),
+        )
+        return top_left, bottom_right
+
+    def paste(self, loc):
+        size = self.tilemap.tile_size
+        changes = {
+            (loc[0] + offset[0], loc[1] + offset[1]): state
+            for offset, state in self.clipboard["tiles"].items()
+        }
+        offgrid = [
+            {
+                "type": tile["type"],
+                "variant": tile["variant"],
+                "pos": [tile["pos"][0] + loc[0] * size, tile["pos"][1] + loc[1] * size],
+            }
+            for tile in self.clipboard["offgrid"]
+        ]
+        self.apply_changes(changes, offgrid)
 
     def run(self):
         while True:
@@ -54,12 +138,12 @@ class Editor:
             self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
 
+            self.tilemap.stream(self.display.get_rect(topleft=render_scroll))
             self.tilemap.render(self.display, offset=render_scroll)
 
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][
-                self.tile_variant
-            ].copy()
-            current_tile_img.set_alpha(100)
+            current_tile_img = self.preview(
+                self.tile_list[self.tile_group], self.tile_variant
+            )
 
             mpos = pygame.mouse.get_pos()
             mpos = (mpos[0] / RENDER_SCALE, mpos[1] / RENDER_SCALE)
@@ -79,16 +163,53 @@ class Editor:
             else:
                 self.display.blit(current_tile_img, mpos)
 
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ";" + str(tile_pos[1])] = {
-                    "type": self.tile_list[self.tile_group],
-                    "variant": self.tile_variant,
-                    "pos": tile_pos,
-                }
-            if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ";" + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
+            if self.drag_start is not None:
+                top_left, bottom_right = self.drag_rect(tile_pos)
+                pygame.draw.rect(
+                    self.display,
+                    (255, 255, 255),
+                    (
+                        top_left[0] * self.tilemap.tile_size - render_scroll[0],
+                        top_left[1] * self.tilemap.tile_size - render_scroll[1],
+                        (bottom_right[0] - top_left[0] + 1) * self.tilemap.tile_size,
+                        (bottom_right[1] - top_left[1] + 1) * self.tilemap.tile_size,
+                    ),
+                    1,
+                )
+            if self.tool == "stamp" and self.clipboard is not None:
+                pygame.draw.rect(
+                    self.display,
+                    (255, 255, 0),
+                    (
+                        tile_pos[0] * self.tilemap.tile_size - render_scroll[0],
+                        tile_pos[1] * self.tilemap.tile_size - render_scroll[1],
+                        self.clipboard["size"][0] * self.tilemap.tile_size,
+                        self.clipboard["size"][1] * self.tilemap.tile_size,
+                    ),
+                    1,
+                )
+
+            if self.tool == "brush" and self.clicking and self.ongrid:
+                tile_type = self.tile_list[self.tile_group]
+                tile = self.tilemap.tilemap.get(tile_pos)
+                if (
+                    tile is None
+                    or tile["type"] != tile_type
+                    or (
+                        tile["variant"] != self.tile_variant
+                        and not (self.autotiling and tile_type in AUTOTILE_TYPES)
+                    )
+                ):
+                    self.history.touch(self.affected([tile_pos]))
+                    self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant)
+                    if self.autotiling:
+                        self.tilemap.autotile_around(tile_pos)
+            if self.tool == "brush" and self.right_clicking:
+                if tile_pos in self.tilemap.tilemap:
+                    self.history.touch(self.affected([tile_pos]))
+                    self.tilemap.remove_tile(tile_pos)
+                    if self.autotiling:
+                        self.tilemap.autotile_around(tile_pos)
                 for tile in self.tilemap.offgrid_tiles.copy():
                     tile_img = self.assets[tile["type"]][tile["variant"]]
                     tile_r = pygame.Rect(
@@ -98,29 +219,66 @@ class Editor:
                         tile_img.get_height(),
                     )
                     if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                        self.tilemap.remove_offgrid(tile)
+                        self.history.record_offgrid(tile, False)
 
             self.display.blit(current_tile_img, (5, 5))
 
+            caption = f"editor | {self.tool} | " + " | ".join(
+                f"{tile_type}: {count}"
+                for tile_type, count in sorted(self.tilemap.type_counts().items())
+            )
+            if self.autosaver.error is not None:
+                caption += f" | save failed: {self.autosaver.error}"
+            if self.notice:
+                caption += f" | {self.notice}"
+            if caption != self.caption:
+                self.caption = caption
+                pygame.display.set_caption(caption)
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.autosaver.flush()
                     pygame.quit()
                     sys.exit()
 
                 if event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button in {1, 3}:
+                        brush_state = None
+                        if event.button == 1:
+                            brush_state = (
+                                self.tile_list[self.tile_group],
+                                self.tile_variant,
+                            )
+                        if self.tool in {"rect", "copy"}:
+                            self.drag_start = tile_pos
+                        if self.tool == "fill":
+                            with collector_paused():
+                                region, complete = self.tilemap.flood_region(tile_pos)
+                                if complete:
+                                    self.apply_changes(
+                                        {loc: brush_state for loc in region}
+                                    )
+                            if not complete:
+                                self.notice = (
+                                    f"fill refused: region over {FLOOD_LIMIT} cells"
+                                )
+                        if self.tool == "stamp" and self.clipboard is not None:
+                            if event.button == 1:
+                                self.paste(tile_pos)
                     if event.button == 1:
                         self.clicking = True
-                        if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append(
-                                {
-                                    "type": self.tile_list[self.tile_group],
-                                    "variant": self.tile_variant,
-                                    "pos": (
-                                        mpos[0] + self.scroll[0],
-                                        mpos[1] + self.scroll[1],
-                                    ),
-                                }
-                            )
+                        if not self.ongrid and self.tool == "brush":
+                            tile = {
+                                "type": self.tile_list[self.tile_group],
+                                "variant": self.tile_variant,
+                                "pos": (
+                                    mpos[0] + self.scroll[0],
+                                    mpos[1] + self.scroll[1],
+                                ),
+                            }
+                            self.tilemap.add_offgrid(tile)
+                            self.history.record_offgrid(tile, True)
                     if event.button == 3:
                         self.right_clicking = True
                     if self.shift:
@@ -144,10 +302,38 @@ class Editor:
                             )
                             self.tile_variant = 0
                 if event.type == pygame.MOUSEBUTTONUP:
+                    if event.button in {1, 3} and self.drag_start is not None:
+                        top_left, bottom_right = self.drag_rect(tile_pos)
+                        if self.tool == "rect":
+                            state = None
+                            if event.button == 1:
+                                state = (
+                                    self.tile_list[self.tile_group],
+                                    self.tile_variant,
+                                )
+                            self.apply_changes(
+                                {
+                                    (x, y): state
+                                    for x in range(top_left[0], bottom_right[0] + 1)
+                                    for y in range(top_left[1], bottom_right[1] + 1)
+                                }
+                            )
+                        if self.tool == "copy":
+                            self.clipboard = self.tilemap.copy_region(
+                                top_left, bottom_right
+                            )
+                            self.clipboard["size"] = (
+                                bottom_right[0] - top_left[0] + 1,
+                                bottom_right[1] - top_left[1] + 1,
+                            )
+                            self.tool = "stamp"
+                        self.drag_start = None
                     if event.button == 1:
                         self.clicking = False
                     if event.button == 3:
                         self.right_clicking = False
+                    if not self.clicking and not self.right_clicking:
+                        self.history.end()
 
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_UP:
@@ -169,9 +355,35 @@ class Editor:
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_t:
+                        self.history.touch(list(self.tilemap.tilemap))
                         self.tilemap.autotile()
+                        self.history.end()
+                    if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        if event.mod & pygame.KMOD_SHIFT:
+                            self.history.redo()
+                        else:
+                            self.history.undo()
+                    if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        self.history.redo()
+                    if event.key == pygame.K_l:
+                        self.autotiling = not self.autotiling
+                    if event.key == pygame.K_b:
+                        self.tool = "brush"
+                    if event.key == pygame.K_r:
+                        self.tool = "rect"
+                    if event.key == pygame.K_f:
+                        self.tool = "fill"
+                    if event.key == pygame.K_c:
+                        self.tool = "copy"
+                    if event.key == pygame.K_v and self.clipboard is not None:
+                        self.tool = "stamp"
+                    if event.key in {pygame.K_b, pygame.K_r, pygame.K_f, pygame.K_c}:
+                        self.drag_start = None
                     if event.key == pygame.K_o:
-                        self.tilemap.save("map.json")
+                        if self.shift and not is_world(MAP_PATH):
+                            self.autosaver.save(MAP_PATH + JSON_EXT)
+                        else:
+                            self.autosaver.save()
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP:
@@ -186,6 +398,8 @@ class Editor:
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
 
+            self.autosaver.update()
+
             self.screen.blit(
                 pygame.transform.scale(self.display, self.screen.get_size()), (0, 0)
             )
@@ -0,0 +1,86 @@
+import heapq
+import math
+import random
+
+from scripts.particle import Particle
+
+# A spawner emits on a given frame with probability area / LEAF_AREA.
+LEAF_AREA = 49999
+# Trees this far outside the camera still drop leaves that can drift into view.
+LEAF_MARGIN = 128
+LEAF_VELOCITY = (-0.1, 0.3)
+
+
+class LeafEmitters:
+    # Ambient leaf spawners kept in a heap ordered by the frame of their next
+    # spawn. The gaps are drawn from an exponential distribution whose ceiling
+    # gives the same geometric distribution as one coin flip per frame, so only
+    # the spawners that are due are touched each frame.
+    def __init__(self, game, rects):
+        self.game = game
+        self.rects = rects
+        self.frame = 0
+        self.leaves = []
+        # Leaves are cosmetic, so they draw from their own generator and leave
+        # the shared one to the simulation, which snapshots replay.
+        self.random = random.Random()
+
+        self.clip = game.assets["particle/leaf"]
+        self.sway = [math.sin(frame * 0.035) * 0.3 for frame in range(self.clip.length)]
+
+        self.rates = []
+        for rect in rects:
+            chance = min(rect.width * rect.height / LEAF_AREA, 1)
+            self.rates.append(-math.log(1 - chance) if chance < 1 else math.inf)
+        self.queue = [
+            (self.next_spawn(i), i) for i in range(len(rects)) if self.rates[i]
+        ]
+        heapq.heapify(self.queue)
+
+    def next_spawn(self, index):
+        return self.frame + max(
+            1, math.ceil(self.random.expovariate(self.rates[index]))
+        )
+
+    def spawn(self, rect):
+        pos = (
+            rect.x + self.random.random() * rect.width,
+            rect.y + self.random.random() * rect.height,
+        )
+        self.leaves.append(
+            Particle(
+                self.game,
+                "leaf",
+                pos,
+                velocity=LEAF_VELOCITY,
+                frame=self.random.randint(0, 20),
+            )
+        )
+
+    def update(self, view, emit=True):
+        # With emit off the schedule still advances, but nothing new spawns.
+        self.frame += 1
+        area = view.inflate(LEAF_MARGIN * 2, LEAF_MARGIN * 2)
+        queue = self.queue
+        while queue and queue[0][0] <= self.frame:
+            index = queue[0][1]
+            if emit and area.colliderect(self.rects[index]):
+                self.spawn(self.rects[index])
+            heapq.heapreplace(queue, (self.next_spawn(index), index))
+
+        # Leaf.update plus the sway, done in one pass with a precomputed table.
+        last = self.clip.length - 1
+        sway = self.sway
+        alive = []
+        for leaf in self.leaves:
+            if leaf.frame < last:
+                alive.append(leaf)
+            leaf.frame = min(leaf.frame + 1, last)
+            pos = leaf.pos
+            pos[0] += leaf.velocity[0] + sway[leaf.frame]
+            pos[1] += leaf.velocity[1]
+        self.leaves = alive
+
+    def render(self, surf, offset=(0, 0)):
+        for leaf in self.leaves:
+            leaf.render(surf, offset=offset)
@@ -6,15 +6,49 @@ import pygame
 from scripts.particle import Particle
 from scripts.spark import Spark
 
+WAVE_FREQUENCY = 0.1
+WAVE_AMPLITUDE = 0.6
+INACCURACY_FREQUENCY = 0.2
+MAX_INACCURACY = math.pi / 12
+BLOB_PROJECTILE_SPEED = 2.5
+
+COLLIDE_UP = 1
+COLLIDE_DOWN = 2
+COLLIDE_RIGHT = 4
+COLLIDE_LEFT = 8
+
+# (axis, moving positive): (leading side, tile face it meets, collision flag)
+SWEEP_SIDES = {
+    (0, True): ("right", "left", COLLIDE_RIGHT),
+    (0, False): ("left", "right", COLLIDE_LEFT),
+    (1, True): ("bottom", "top", COLLIDE_DOWN),
+    (1, False): ("top", "bottom", COLLIDE_UP),
+}
+
 
 class PhysicsEntity:
+    __slots__ = (
+        "game",
+        "type",
+        "pos",
+        "size",
+        "velocity",
+        "collisions",
+        "action",
+        "anim_offset",
+        "flip",
+        "animation",
+        "frame",
+        "last_movement",
+    )
+
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
         self.pos = list(pos)
         self.size = size
         self.velocity = [0, 0]
-        self.collisions = {"up": False, "down": False, "right": False, "left": False}
+        self.collisions = 0
 
         self.action = ""
         self.anim_offset = (-3, -3)
@@ -29,41 +63,38 @@ class PhysicsEntity:
     def set_action(self, action):
         if action != self.action:
             self.action = action
-            self.animation = self.game.assets[self.type + "/" + self.action].copy()
+            self.animation = self.game.assets[self.type + "/" + self.action]
+            self.frame = 0
+
+    def sweep(self, tilemap, axis, delta):
+        # Swept AABB along one axis: every solid tile between the start and end
+        # rects is a candidate, and the one with the earliest time of impact
+        # (the nearest leading face) stops the entity. Nothing can tunnel, and
+        # the entity's full size is used rather than the tiles around pos.
+        start = self.rect()
+        self.pos[axis] += delta
+        if not tilemap or not delta:
+            return
+
+        end = self.rect()
+        hits = tilemap.physics_rects_in(start.union(end))
+        if hits:
+            near, far, flag = SWEEP_SIDES[axis, delta > 0]
+            faces = [getattr(rect, far) for rect in hits]
+            setattr(end, near, min(faces) if delta > 0 else max(faces))
+            self.pos[axis] = end[axis]
+            self.collisions |= flag
 
     def update(self, tilemap, movement=(0, 0)):
-        self.collisions = {"up": False, "down": False, "right": False, "left": False}
+        self.collisions = 0
 
         frame_movement = (
             movement[0] + self.velocity[0],
             movement[1] + self.velocity[1],
         )
 
-        self.pos[0] += frame_movement[0]
-        entity_rect = self.rect()
-        if tilemap:
-            for rect in tilemap.physics_rects_around(self.pos):
-                if entity_rect.colliderect(rect):
-                    if frame_movement[0] > 0:
-                        entity_rect.right = rect.left
-                        self.collisions["right"] = True
-                    if frame_movement[0] < 0:
-                        entity_rect.left = rect.right
-                        self.collisions["left"] = True
-                    self.pos[0] = entity_rect.x
-
-        self.pos[1] += frame_movement[1]
-        entity_rect = self.rect()
-        if tilemap:
-            for rect in tilemap.physics_rects_around(self.pos):
-                if entity_rect.colliderect(rect):
-                    if frame_movement[1] > 0:
-                        entity_rect.bottom = rect.top
-                        self.collisions["down"] = True
-                    if frame_movement[1] < 0:
-                        entity_rect.top = rect.bottom
-                        self.collisions["up"] = True
-                    self.pos[1] = entity_rect.y
+        self.sweep(tilemap, 0, frame_movement[0])
+        self.sweep(tilemap, 1, frame_movement[1])
 
         if movement[0] > 0:
             self.flip = False
@@ -74,14 +105,14 @@ class PhysicsEntity:
 
         self.velocity[1] = min(5, self.velocity[1] + 0.1)
 
-        if self.collisions["down"] or self.collisions["up"]:
+        if self.collisions & (COLLIDE_DOWN | COLLIDE_UP):
             self.velocity[1] = 0
 
-        self.animation.update()
+        self.frame = self.animation.advance(self.frame)
 
     def render(self, surf, offset=(0, 0)):
         surf.blit(
-            pygame.transform.flip(self.animation.img(), self.flip, False),
+            self.animation.img(self.frame, self.flip),
             (
                 self.pos[0] - offset[0] + self.anim_offset[0],
                 self.pos[1] - offset[1] + self.anim_offset[1],
@@ -90,6 +121,20 @@ class PhysicsEntity:
 
 
 class Blob(PhysicsEntity):
+    __slots__ = (
+        "health",
+        "speed",
+        "state",
+        "aggro_distance",
+        "idle_timer",
+        "idle_movement",
+        "chase_timer",
+        "shoot_cooldown",
+        "shoot_delay",
+        "hit_timer",
+        "slot",
+    )
+
     def __init__(self, game, pos, size):
         super().__init__(game, "tblob", pos, size)
         self.health = 5
@@ -107,20 +152,24 @@ class Blob(PhysicsEntity):
         self.shoot_delay = 5
 
         self.hit_timer = 0
-        self.float_particle_timer = 0
+        self.slot = None
 
         self.set_action("idle")
 
     def update(self, player, tilemap, movement=(0, 0)):
+        self.move(self.think(player))
+
+    def think(self, player):
         if self.hit_timer > 0:
             self.hit_timer -= 1
 
-        target_pos = (player.rect().centerx, player.rect().centery - 50)
+        player_rect = player.rect()
+        target_pos = (player_rect.centerx, player_rect.centery - 50)
         movement_dx = target_pos[0] - self.pos[0]
         movement_dy = target_pos[1] - self.pos[1]
 
-        shoot_dx = player.rect().centerx - self.pos[0]
-        shoot_dy = player.rect().centery - self.pos[1]
+        shoot_dx = player_rect.centerx - self.pos[0]
+        shoot_dy = player_rect.centery - self.pos[1]
         distance = math.sqrt(shoot_dx**2 + shoot_dy**2)
 
         if (distance < self.aggro_distance) or (self.hit_timer > 0):
@@ -137,9 +186,7 @@ class Blob(PhysicsEntity):
             if self.shoot_cooldown > 0:
                 angle_to_target = math.atan2(movement_dy, movement_dx)
                 perp_angle = angle_to_target + math.pi / 2
-                wave_frequency = 0.1
-                wave_amplitude = 0.6
-                offset = math.sin(self.chase_timer * wave_frequency) * wave_amplitude
+                offset = math.sin(self.chase_timer * WAVE_FREQUENCY) * WAVE_AMPLITUDE
                 vel_x = (
                     math.cos(angle_to_target) * self.speed
                     + math.cos(perp_angle) * offset
@@ -154,24 +201,10 @@ class Blob(PhysicsEntity):
                 self.shoot_cooldown = self.shoot_delay
                 vel = (0, 0)
                 angle_to_player = math.atan2(shoot_dy, shoot_dx)
-
-                max_inaccuracy = math.pi / 12
-                inaccuracy_frequency = 0.2
                 inaccuracy = (
-                    math.sin(self.chase_timer * inaccuracy_frequency) * max_inaccuracy
-                )
-                final_angle = angle_to_player + inaccuracy
-
-                projectile_speed = 2.5
-                vel_x = math.cos(final_angle) * projectile_speed
-                vel_y = math.sin(final_angle) * projectile_speed
-                spawn_pos = [
-                    self.pos[0] + self.size[0] / 2,
-                    self.pos[1] + self.size[1] / 2,
-                ]
-                self.game.projectiles.append(
-                    {"pos": spawn_pos, "vel": [vel_x, vel_y], "owner": "enemy"}
+                    math.sin(self.chase_timer * INACCURACY_FREQUENCY) * MAX_INACCURACY
                 )
+                self.fire(angle_to_player + inaccuracy)
 
         elif self.state == "idle":
             self.idle_timer -= 1
@@ -185,6 +218,21 @@ class Blob(PhysicsEntity):
                 )
             vel = self.idle_movement
 
+        return vel
+
+    def fire(self, angle):
+        vel_x = math.cos(angle) * BLOB_PROJECTILE_SPEED
+        vel_y = math.sin(angle) * BLOB_PROJECTILE_SPEED
+        spawn_pos = [
+            self.pos[0] + self.size[0] / 2,
+            self.pos[1] + self.size[1] / 2,
+        ]
+        self.game.projectiles.append(
+            {"pos": spawn_pos, "vel": [vel_x, vel_y], "owner": "enemy"}
+        )
+        self.game.audio.play("enemy_shoot")
+
+    def move(self, vel):
         self.pos[0] += vel[0]
         self.pos[1] += vel[1]
 
@@ -193,25 +241,12 @@ class Blob(PhysicsEntity):
         if vel[0] < 0:
             self.flip = True
 
-        self.float_particle_timer -= 1
-        if self.float_particle_timer <= 0:
-            self.float_particle_timer = random.randint(10, 20)
-
-            angle = random.uniform(0, 2 * math.pi)
-            radius = self.size[0] / 2
-            p_x = self.rect().centerx + math.cos(angle) * radius
-            p_y = self.rect().centery + math.sin(angle) * radius
-
-            particle_pos = [p_x, p_y]
-            particle_size = random.uniform(2, 4)
-            self.game.float_particles.append(
-                {"pos": particle_pos, "size": particle_size, "color": (120, 40, 150)}
-            )
-
-        self.animation.update()
+        self.frame = self.animation.advance(self.frame)
 
 
 class Enemy(PhysicsEntity):
+    __slots__ = ("health", "walking", "hit_timer")
+
     def __init__(self, game, pos, size):
         super().__init__(game, "enemy", pos, size)
         self.health = 2
@@ -225,8 +260,11 @@ class Enemy(PhysicsEntity):
             self.hit_timer -= 1
 
             dis_x = self.game.player.pos[0] - self.pos[0]
+            direction = self.game.nav.direction(self.rect(), self.game.player.rect())
 
-            if tilemap.solid_check(
+            if direction is not None:
+                movement[0] += 0.6 * direction
+            elif tilemap.solid_check(
                 (self.rect().centerx + (-7 if dis_x < 0 else 7), self.pos[1] + 23)
             ):
                 if dis_x > 0:
@@ -242,7 +280,7 @@ class Enemy(PhysicsEntity):
                 if tilemap.solid_check(
                     (self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)
                 ):
-                    if self.collisions["right"] or self.collisions["left"]:
+                    if self.collisions & (COLLIDE_RIGHT | COLLIDE_LEFT):
                         self.flip = not self.flip
                     else:
                         movement[0] += -0.5 if self.flip else 0.5
@@ -255,7 +293,11 @@ class Enemy(PhysicsEntity):
                         self.game.player.pos[1] - self.pos[1],
                     )
                     if abs(dis[1]) < 16:
-                        if (self.flip and dis[0] < 0) or (not self.flip and dis[0] > 0):
+                        if (
+                            (self.flip and dis[0] < 0) or (not self.flip and dis[0] > 0)
+                        ) and tilemap.line_of_sight(
+                            self.rect().center, self.game.player.rect().center
+                        ):
                             angle = math.atan2(dis[1], dis[0])
                             speed = 1.5
                             vel_x = math.cos(angle) * speed
@@ -265,21 +307,22 @@ class Enemy(PhysicsEntity):
                                 self.pos[0] + self.size[0] / 2,
                                 self.pos[1] + self.size[1] / 2,
                             ]
-                            self.game.projectiles.append(
-                                {
-                                    "pos": spawn_pos,
-                                    "vel": [vel_x, vel_y],
-                                    "owner": "enemy",
-                                }
-                            )
-
-                            for i in range(4):
-                                spark_angle = angle + random.random() * 0.5 - 0.25
+                            projectile = {
+                                "pos": spawn_pos,
+                                "vel": [vel_x, vel_y],
+                                "owner": "enemy",
+                            }
+                            self.game.projectiles.append(projectile)
+                            self.game.audio.play("enemy_shoot")
+
+                            fx_random = self.game.quality.random
+                            for i in range(self.game.quality.count(4)):
+                                spark_angle = angle + fx_random.random() * 0.5 - 0.25
                                 self.game.sparks.append(
                                     Spark(
-                                        self.game.projectiles[-1]["pos"],
+                                        projectile["pos"],
                                         spark_angle,
-                                        2 + random.random(),
+                                        2 + fx_random.random(),
                                     )
                                 )
             elif random.random() < 0.01:
@@ -314,6 +357,19 @@ class Enemy(PhysicsEntity):
 
 
 class Player(PhysicsEntity):
+    __slots__ = (
+        "air_time",
+        "jumps",
+        "wall_slide",
+        "dashing",
+        "maxhealth",
+        "health",
+        "shoot_cooldown",
+        "max_ammo",
+        "ammo",
+        "dash_duration",
+    )
+
     def __init__(self, game, pos, size):
         super().__init__(game, "player", pos, size)
         self.air_time = 0
@@ -335,7 +391,7 @@ class Player(PhysicsEntity):
 
         self.air_time += 1
 
-        if self.collisions["down"]:
+        if self.collisions & COLLIDE_DOWN:
             self.air_time = 0
             self.jumps = 2
 
@@ -348,9 +404,10 @@ class Player(PhysicsEntity):
                 self.set_action("idle")
 
         if abs(self.dashing) in {self.dash_duration, self.dash_duration - 10}:
-            for i in range(20):
-                angle = random.random() * math.pi * 2
-                speed = random.random() * 0.5 + 0.5
+            fx_random = self.game.quality.random
+            for i in range(self.game.quality.count(20)):
+                angle = fx_random.random() * math.pi * 2
+                speed = fx_random.random() * 0.5 + 0.5
                 pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]
                 self.game.particles.append(
                     Particle(
@@ -358,7 +415,7 @@ class Player(PhysicsEntity):
                         "particle",
                         self.rect().center,
                         velocity=pvelocity,
-                        frame=random.randint(0, 7),
+                        frame=fx_random.randint(0, 7),
                     )
                 )
         if self.dashing > 0:
@@ -369,14 +426,15 @@ class Player(PhysicsEntity):
             self.velocity[0] = abs(self.dashing) / self.dashing * 8
             if abs(self.dashing) == self.dash_duration - 9:
                 self.velocity[0] *= 0.1
-            pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
+            fx_random = self.game.quality.random
+            pvelocity = [abs(self.dashing) / self.dashing * fx_random.random() * 3, 0]
             self.game.particles.append(
                 Particle(
                     self.game,
                     "particle",
                     self.rect().center,
                     velocity=pvelocity,
-                    frame=random.randint(0, 7),
+                    frame=fx_random.randint(0, 7),
                 )
             )
 
@@ -416,6 +474,7 @@ class Player(PhysicsEntity):
                 self.dashing = -self.dash_duration
             else:
                 self.dashing = self.dash_duration
+            return True
 
     def shoot(self, mouse_pos):
         if self.shoot_cooldown == 0 and self.ammo > 0:
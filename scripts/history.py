@@ -0,0 +1,90 @@
+from collections import deque
+
+from scripts.tilemap import tile_state
+
+MAX_CELLS = 200000
+
+
+class Stroke:
+    def __init__(self):
+        self.before = {}
+        self.after = {}
+        self.offgrid = []
+
+    def size(self):
+        return len(self.after) + len(self.offgrid)
+
+
+class EditHistory:
+    def __init__(self, tilemap, max_cells=MAX_CELLS):
+        self.tilemap = tilemap
+        self.max_cells = max_cells
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.cells = 0
+        self.stroke = None
+
+    def begin(self):
+        if self.stroke is None:
+            self.stroke = Stroke()
+
+    def touch(self, locs):
+        # Call before changing grid cells: only the first state seen in a
+        # stroke is kept, so repainting a cell during a drag costs nothing.
+        self.begin()
+        before = self.stroke.before
+        new = [loc for loc in locs if loc not in before] if before else locs
+        before.update(zip(new, map(tile_state, map(self.tilemap.tilemap.get, new))))
+
+    def record_offgrid(self, tile, added):
+        self.begin()
+        self.stroke.offgrid.append((tile, added))
+
+    def end(self):
+        stroke = self.stroke
+        self.stroke = None
+        if stroke is None:
+            return
+
+        before = stroke.before
+        afters = map(tile_state, map(self.tilemap.tilemap.get, before))
+        stroke.after = {
+            loc: after
+            for (loc, state), after in zip(before.items(), afters)
+            if after != state
+        }
+        if len(stroke.after) < len(before):
+            stroke.before = {loc: before[loc] for loc in stroke.after}
+        if not stroke.size():
+            return
+
+        self.undo_stack.append(stroke)
+        self.cells += stroke.size()
+        self.redo_stack = []
+        while self.cells > self.max_cells and len(self.undo_stack) > 1:
+            self.cells -= self.undo_stack.popleft().size()
+
+    def _apply(self, states, offgrid, undo):
+        self.tilemap.apply(states)
+
+        for tile, added in reversed(offgrid) if undo else offgrid:
+            if added != undo:
+                self.tilemap.add_offgrid(tile)
+            else:
+                self.tilemap.remove_offgrid(tile)
+
+    def undo(self):
+        self.end()
+        if self.undo_stack:
+            stroke = self.undo_stack.pop()
+            self.cells -= stroke.size()
+            self._apply(stroke.before, stroke.offgrid, True)
+            self.redo_stack.append(stroke)
+
+    def redo(self):
+        self.end()
+        if self.redo_stack:
+            stroke = self.redo_stack.pop()
+            self._apply(stroke.after, stroke.offgrid, False)
+            self.undo_stack.append(stroke)
+            self.cells += stroke.size()
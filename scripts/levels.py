@@ -0,0 +1,176 @@
+import hashlib
+import os
+import pickle
+import sys
+
+import pygame
+
+import scripts.mapfile as mapfile
+import scripts.navigation as navigation
+import scripts.tilemap as tilemap_module
+from scripts.mapfile import BINARY_EXT, JSON_EXT, atomic_open, resolve_map
+from scripts.navigation import NavGraph
+from scripts.tilemap import Tilemap
+
+# A compiled level is everything the game derives from a map file before play:
+# the tilemap with its spawners taken out, spawn positions, leaf spawner rects
+# and the navigation graph. Artifacts are pickled into CACHE_DIR, named after
+# the map's path and keyed by the SHA-1 of its bytes plus the source of every
+# module the result depends on, so editing either the map or the compiler
+# misses the cache. Writing an artifact removes older ones for the same map.
+CACHE_DIR = ".level_cache"
+CACHE_EXT = ".level"
+COMPILER_MODULES = (sys.modules[__name__], navigation, tilemap_module, mapfile)
+
+TREE = ("large_decor", 2)
+SPAWNERS = [("spawners", 0), ("spawners", 1), ("spawners", 2)]
+LEAF_RECT = (4, 4, 23, 13)
+VIEW_SIZE = (320, 240)
+
+
+def derive(tilemap, view_size=VIEW_SIZE):
+    # Takes the spawners out of tilemap and returns the level data built from
+    # it. Shared by compiled maps and chunked worlds, which are not cached.
+    data = {
+        "leaf_spawners": [],
+        "player_spawn_pos": None,
+        "enemies": [],
+        "blobs": [],
+    }
+    x, y, width, height = LEAF_RECT
+    for tree in tilemap.extract([TREE], keep=True):
+        data["leaf_spawners"].append(
+            (x + tree["pos"][0], y + tree["pos"][1], width, height)
+        )
+
+    for spawner in tilemap.extract(SPAWNERS):
+        if spawner["variant"] == 0:
+            data["player_spawn_pos"] = spawner["pos"]
+        elif spawner["variant"] == 2:
+            data["blobs"].append(spawner["pos"])
+        else:
+            data["enemies"].append(spawner["pos"])
+
+    spawn = data["player_spawn_pos"]
+    if spawn is not None:
+        view = pygame.Rect((0, 0), view_size)
+        view.center = spawn
+        tilemap.stream(view, block=True)
+    data["nav"] = NavGraph(tilemap)
+    return data
+
+
+def compile_level(path):
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    data = derive(tilemap)
+    return {
+        "compiler": compiler_digest(),
+        "map": {
+            "tilemap": tilemap.tilemap,
+            "tile_size": tilemap.tile_size,
+            "offgrid": tilemap.offgrid_tiles,
+        },
+        "level": data,
+    }
+
+
+_compiler_digest = None
+
+
+def compiler_digest():
+    global _compiler_digest
+    if _compiler_digest is None:
+        digest = hashlib.sha1()
+        for module in COMPILER_MODULES:
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _compiler_digest = digest.hexdigest()
+    return _compiler_digest
+
+
+def cache_prefix(path):
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+
+
+def cache_path(path, source, cache_dir=CACHE_DIR):
+    key = hashlib.sha1(compiler_digest().encode("ascii") + source).hexdigest()
+    return os.path.join(cache_dir, f"{cache_prefix(path)}-{key}{CACHE_EXT}")
+
+
+def prune_cache(path, keep, cache_dir=CACHE_DIR):
+    # Removes the artifacts of earlier versions of the map at path.
+    prefix = cache_prefix(path) + "-"
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith(CACHE_EXT):
+            target = os.path.join(cache_dir, name)
+            if target != keep:
+                os.remove(target)
+
+
+def load_compiled(path, cache_dir=CACHE_DIR):
+    # Returns the compiled artifact for the map at path, compiling and caching
+    # it first if there is no fresh one. A cache that can't be read, written
+    # or unpickled (say after a class it holds was renamed) is a miss.
+    with open(path, "rb") as f:
+        target = cache_path(path, f.read(), cache_dir)
+
+    try:
+        with open(target, "rb") as f:
+            artifact = pickle.load(f)
+        if artifact["compiler"] == compiler_digest():
+            return artifact
+    except Exception:
+        pass
+
+    artifact = compile_level(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with atomic_open(target, "wb") as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+        prune_cache(path, target, cache_dir)
+    except OSError:
+        pass
+    return artifact
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    # Removes every cached artifact and returns how many there were.
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_EXT):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+# ==============================================================================
+# Usage: python -m scripts.levels [--clear] [map ...]
+#   map      map files to compile into the cache (default every single-file map
+#            in data/maps, the newer of .map and .json like the game loads)
+#   --clear  empty the cache first
+# ==============================================================================
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--clear" in args:
+        args.remove("--clear")
+        print(f"removed {clear_cache()} cached levels")
+
+    if not args:
+        stems = {
+            os.path.join("data/maps", os.path.splitext(name)[0])
+            for name in os.listdir("data/maps")
+            if os.path.splitext(name)[1] in (BINARY_EXT, JSON_EXT)
+        }
+        args = [resolve_map(stem) for stem in sorted(stems)]
+
+    for path in args:
+        artifact = load_compiled(path)
+        level = artifact["level"]
+        print(
+            f"{path}: {len(artifact['map']['tilemap'])} tiles,"
+            f" {len(level['enemies'])} enemies, {len(level['blobs'])} blobs,"
+            f" {len(level['nav'].segments)} nav segments"
+        )
@@ -0,0 +1,212 @@
+import array
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Binary map layout (little-endian):
+#   header      magic, version, tile_size, type count, grid count, offgrid count
+#   type table  one length-prefixed utf-8 name per tile type
+#   grid        int32 xs, int32 ys, uint16 type ids, uint16 variants
+#   offgrid     float64 xs, float64 ys, uint16 type ids, uint16 variants
+# Version 1 files stored off-grid positions as float32 and are still read.
+MAGIC = b"THMP"
+VERSION = 2
+OFFGRID_CODES = {1: "f", 2: "d"}
+HEADER = struct.Struct("<4sHHHII")
+NAME_LEN = struct.Struct("<B")
+
+BINARY_EXT = ".map"
+JSON_EXT = ".json"
+
+_io = None
+
+
+def io_executor():
+    # Single worker shared by every background map read and write, so a read
+    # queued after a write always sees the new file.
+    global _io
+    if _io is None:
+        _io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-io")
+    return _io
+
+
+@contextmanager
+def atomic_open(path, mode):
+    # Write next to the target and rename over it, so readers never see a
+    # half-written file.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        yield f
+    os.replace(tmp_path, path)
+
+
+def _read_array(typecode, buf, offset, count):
+    values = array.array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(buf[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def _write_array(f, typecode, values):
+    values = array.array(typecode, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    f.write(values.tobytes())
+
+
+def read_binary(path):
+    with open(path, "rb") as f:
+        buf = memoryview(f.read())
+
+    magic, version, tile_size, type_count, grid_count, offgrid_count = (
+        HEADER.unpack_from(buf, 0)
+    )
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a Tiny Hunter map file")
+    if version not in OFFGRID_CODES:
+        raise ValueError(f"{path} has unsupported map version {version}")
+
+    offset = HEADER.size
+    types = []
+    for i in range(type_count):
+        (length,) = NAME_LEN.unpack_from(buf, offset)
+        offset += NAME_LEN.size
+        types.append(bytes(buf[offset : offset + length]).decode("utf-8"))
+        offset += length
+
+    xs, offset = _read_array("i", buf, offset, grid_count)
+    ys, offset = _read_array("i", buf, offset, grid_count)
+    type_ids, offset = _read_array("H", buf, offset, grid_count)
+    variants, offset = _read_array("H", buf, offset, grid_count)
+    tilemap = {
+        (x, y): {"type": types[t], "variant": v, "pos": [x, y]}
+        for x, y, t, v in zip(xs, ys, type_ids, variants)
+    }
+
+    pos_code = OFFGRID_CODES[version]
+    xs, offset = _read_array(pos_code, buf, offset, offgrid_count)
+    ys, offset = _read_array(pos_code, buf, offset, offgrid_count)
+    type_ids, offset = _read_array("H", buf, offset, offgrid_count)
+    variants, offset = _read_array("H", buf, offset, offgrid_count)
+    offgrid = [
+        {"type": types[t], "variant": v, "pos": [x, y]}
+        for x, y, t, v in zip(xs, ys, type_ids, variants)
+    ]
+
+    return {"tilemap": tilemap, "tile_size": tile_size, "offgrid": offgrid}
+
+
+def write_binary(path, map_data):
+    tilemap = map_data["tilemap"]
+    offgrid = map_data["offgrid"]
+
+    types = {}
+    for tile in list(tilemap.values()) + offgrid:
+        types.setdefault(tile["type"], len(types))
+
+    grid_tiles = list(tilemap.values())
+    with atomic_open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                map_data["tile_size"],
+                len(types),
+                len(grid_tiles),
+                len(offgrid),
+            )
+        )
+        for name in types:
+            encoded = name.encode("utf-8")
+            f.write(NAME_LEN.pack(len(encoded)))
+            f.write(encoded)
+
+        for tiles, pos_code in ((grid_tiles, "i"), (offgrid, OFFGRID_CODES[VERSION])):
+            _write_array(f, pos_code, [tile["pos"][0] for tile in tiles])
+            _write_array(f, pos_code, [tile["pos"][1] for tile in tiles])
+            _write_array(f, "H", [types[tile["type"]] for tile in tiles])
+            _write_array(f, "H", [tile["variant"] for tile in tiles])
+
+
+def read_json(path):
+    with open(path, "r") as f:
+        map_data = json.load(f)
+
+    map_data["tilemap"] = {
+        (tile["pos"][0], tile["pos"][1]): tile for tile in map_data["tilemap"].values()
+    }
+    return map_data
+
+
+def write_json(path, map_data):
+    with atomic_open(path, "w") as f:
+        json.dump(
+            {
+                "tilemap": {
+                    str(loc[0]) + ";" + str(loc[1]): tile
+                    for loc, tile in map_data["tilemap"].items()
+                },
+                "tile_size": map_data["tile_size"],
+                "offgrid": map_data["offgrid"],
+            },
+            f,
+        )
+
+
+def read_map(path):
+    if path.endswith(JSON_EXT):
+        return read_json(path)
+    return read_binary(path)
+
+
+def write_map(path, map_data):
+    if path.endswith(JSON_EXT):
+        write_json(path, map_data)
+    else:
+        write_binary(path, map_data)
+
+
+def convert(src, dst):
+    write_map(dst, read_map(src))
+
+
+def swap_ext(path):
+    root, ext = os.path.splitext(path)
+    return root + (BINARY_EXT if ext == JSON_EXT else JSON_EXT)
+
+
+def resolve_map(stem):
+    # The .map or .json file for stem, whichever was written last, so a JSON
+    # export or hand edit isn't shadowed by an older binary map. Ties go to the
+    # .map. None if neither exists.
+    paths = [stem + ext for ext in (BINARY_EXT, JSON_EXT) if os.path.exists(stem + ext)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+# ==============================================================================
+# Usage:
+#   python -m scripts.mapfile data/maps            convert every .json map to .map
+#   python -m scripts.mapfile 0.json [0.map]       convert one map, either way
+# ==============================================================================
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) == 1 and os.path.isdir(args[0]):
+        for name in sorted(os.listdir(args[0])):
+            if name.endswith(JSON_EXT):
+                src = os.path.join(args[0], name)
+                convert(src, swap_ext(src))
+                print(f"{src} -> {swap_ext(src)}")
+    elif len(args) in {1, 2}:
+        dst = args[1] if len(args) == 2 else swap_ext(args[0])
+        convert(args[0], dst)
+        print(f"{args[0]} -> {dst}")
+    else:
+        print("usage: python -m scripts.mapfile <map dir | src> [dst]")
+        sys.exit(1)
@@ -0,0 +1,196 @@
+import argparse
+import os
+import random
+import tempfile
+
+from scripts.chunks import split_map
+from scripts.mapfile import BINARY_EXT, JSON_EXT, write_map
+from scripts.tilemap import Tilemap
+
+# Platforms sit at the bottom of horizontal bands of BAND rows. At most
+# MAX_THICKNESS rows of each band are solid, which leaves room above every
+# platform for a blob and caps how much of the map can be filled.
+BAND = 8
+MAX_THICKNESS = 3
+MAX_FILL = MAX_THICKNESS / BAND
+PLATFORM_LENGTH = (3, 14)
+# Platform placements tried per cell still to fill before giving up, for
+# densities that overlapping platforms can't quite reach.
+ATTEMPTS_PER_CELL = 4
+
+# Image sizes of the off-grid tiles, used to stand them on a platform.
+DECOR = {
+    ("decor", 0): (16, 16),
+    ("decor", 1): (16, 16),
+    ("decor", 2): (16, 16),
+    ("decor", 3): (16, 16),
+    ("large_decor", 0): (31, 11),
+    ("large_decor", 1): (20, 12),
+}
+TREE = ("large_decor", 2)
+TREE_SIZE = (40, 40)
+# Rows above the platform surface for each spawner variant. Blobs are 65px
+# tall, so they start five rows up and drop onto the platform.
+SPAWNER_ROWS = {0: 1, 1: 1, 2: 5}
+
+
+def platforms(rng, width, height, grass, stone):
+    # Grid cells for each platform type, as sets of (x, y).
+    cells = {"grass": set(), "stone": set()}
+    targets = {
+        "grass": int(width * height * grass),
+        "stone": int(width * height * stone),
+    }
+    bands = height // BAND
+    for tile_type in ("grass", "stone"):
+        filled = cells[tile_type]
+        other = cells["stone" if tile_type == "grass" else "grass"]
+        attempts = targets[tile_type] * ATTEMPTS_PER_CELL
+        while len(filled) < targets[tile_type] and attempts > 0:
+            attempts -= 1
+            length = rng.randint(*PLATFORM_LENGTH)
+            thickness = rng.randint(1, MAX_THICKNESS)
+            x0 = rng.randrange(max(1, width - length + 1))
+            bottom = rng.randrange(bands) * BAND + BAND
+            for x in range(x0, min(x0 + length, width)):
+                for y in range(bottom - thickness, bottom):
+                    if (x, y) not in other:
+                        filled.add((x, y))
+    return cells
+
+
+def generate(
+    width,
+    height,
+    seed=0,
+    grass=0.12,
+    stone=0.0,
+    decor=4.0,
+    trees=1.0,
+    enemies=3.0,
+    blobs=0.8,
+    tile_size=16,
+):
+    # Returns map data in the format read_map() gives, for a map of width by
+    # height cells. grass and stone are the share of cells each fills; decor,
+    # trees, enemies and blobs are counts per 1000 cells. Every map has one
+    # player spawner. The same arguments always give the same map.
+    if grass < 0 or stone < 0 or grass + stone > MAX_FILL:
+        raise ValueError(f"grass + stone must be between 0 and {MAX_FILL}")
+    if height < BAND:
+        raise ValueError(f"maps need at least {BAND} rows")
+
+    rng = random.Random(seed)
+    tilemap = Tilemap(None, tile_size=tile_size)
+    for tile_type, cells in platforms(rng, width, height, grass, stone).items():
+        for loc in sorted(cells):
+            tilemap.tilemap[loc] = {"type": tile_type, "variant": 0, "pos": list(loc)}
+    tilemap.build_index()
+    tilemap.autotile()
+
+    # Decor and spawners stand on cells with nothing above them, one each.
+    surface = [
+        loc for loc in tilemap.tilemap if (loc[0], loc[1] - 1) not in tilemap.tilemap
+    ]
+    area = width * height / 1000
+    counts = [
+        ("player", 1),
+        ("enemies", round(enemies * area)),
+        ("blobs", round(blobs * area)),
+        ("trees", round(trees * area)),
+        ("decor", round(decor * area)),
+    ]
+    total = min(len(surface), sum(count for kind, count in counts))
+    spots = iter(rng.sample(surface, total))
+
+    offgrid = []
+    for kind, count in counts:
+        for i, (x, y) in zip(range(count), spots):
+            if kind in ("player", "enemies", "blobs"):
+                variant = {"player": 0, "enemies": 1, "blobs": 2}[kind]
+                loc = (x, y - SPAWNER_ROWS[variant])
+                tilemap.tilemap[loc] = {
+                    "type": "spawners",
+                    "variant": variant,
+                    "pos": list(loc),
+                }
+                continue
+
+            if kind == "trees":
+                tile_type, variant = TREE
+                size = TREE_SIZE
+            else:
+                tile_type, variant = rng.choice(list(DECOR))
+                size = DECOR[(tile_type, variant)]
+            offgrid.append(
+                {
+                    "type": tile_type,
+                    "variant": variant,
+                    "pos": [
+                        x * tile_size + rng.uniform(0, max(0, tile_size - size[0])),
+                        float(y * tile_size - size[1]),
+                    ],
+                }
+            )
+
+    return {"tilemap": tilemap.tilemap, "tile_size": tile_size, "offgrid": offgrid}
+
+
+def write_generated(path, map_data):
+    # Single-file maps for a .map or .json path, a chunked world otherwise.
+    if os.path.splitext(path)[1] in (BINARY_EXT, JSON_EXT):
+        write_map(path, map_data)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "map" + BINARY_EXT)
+        write_map(src, map_data)
+        split_map(src, path)
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+# ==============================================================================
+# Usage: python -m scripts.mapgen path [options]
+#   path       where to write the map: a .map or .json file, or a directory for
+#              a chunked world
+#   --size     map size in cells as WIDTHxHEIGHT (default 200x120)
+#   --seed     generator seed (default 0)
+#   --grass    share of cells that are grass platforms (default 0.12)
+#   --stone    share of cells that are stone platforms (default 0); the game
+#              ships no stone images, so only non-rendering code can load these
+#   --decor    off-grid decor per 1000 cells (default 4)
+#   --trees    trees per 1000 cells (default 1)
+#   --enemies  enemy spawners per 1000 cells (default 3)
+#   --blobs    blob spawners per 1000 cells (default 0.8)
+# ==============================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a stress-test map.")
+    parser.add_argument("path")
+    parser.add_argument("--size", type=parse_size, default=(200, 120))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grass", type=float, default=0.12)
+    parser.add_argument("--stone", type=float, default=0.0)
+    parser.add_argument("--decor", type=float, default=4.0)
+    parser.add_argument("--trees", type=float, default=1.0)
+    parser.add_argument("--enemies", type=float, default=3.0)
+    parser.add_argument("--blobs", type=float, default=0.8)
+    args = parser.parse_args()
+
+    map_data = generate(
+        *args.size,
+        seed=args.seed,
+        grass=args.grass,
+        stone=args.stone,
+        decor=args.decor,
+        trees=args.trees,
+        enemies=args.enemies,
+        blobs=args.blobs,
+    )
+    write_generated(args.path, map_data)
+    print(
+        f"{args.path}: {len(map_data['tilemap'])} tiles,"
+        f" {len(map_data['offgrid'])} off-grid"
+    )
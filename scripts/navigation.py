@@ -0,0 +1,109 @@
+from collections import deque
+
+from scripts.tilemap import PHYSICS_TILES
+
+# How far a ground enemy will drop, and how high a drop can be climbed back up
+# as a jump link, in tiles.
+MAX_DROP = 12
+JUMP_HEIGHT = 2
+GROUND_KINDS = ("drop",)
+
+
+class NavGraph:
+    # Walkable platform segments (maximal runs of open cells resting on solid
+    # ground, one row tall) linked by drops off their ends and by jumps back up
+    # short drops. Flow fields towards a target segment are built on demand by
+    # a breadth-first search over the reversed links and memoised.
+    def __init__(self, tilemap):
+        self.tile_size = tilemap.tile_size
+        self.segments = []
+        self.cell_segment = {}
+        self.links = []
+        self.flows = {}
+        self.build(tilemap.tilemap)
+
+    def build(self, tiles):
+        def solid(loc):
+            tile = tiles.get(loc)
+            return tile is not None and tile["type"] in PHYSICS_TILES
+
+        floors = sorted(
+            (loc[1] - 1, loc[0])
+            for loc, tile in tiles.items()
+            if tile["type"] in PHYSICS_TILES and not solid((loc[0], loc[1] - 1))
+        )
+        for y, x in floors:
+            if (x - 1, y) in self.cell_segment:
+                index = self.cell_segment[(x - 1, y)]
+                row, left, right = self.segments[index]
+                self.segments[index] = (row, left, x)
+            else:
+                index = len(self.segments)
+                self.segments.append((y, x, x))
+            self.cell_segment[(x, y)] = index
+
+        self.links = [[] for segment in self.segments]
+        for index, (y, left, right) in enumerate(self.segments):
+            for exit_x, side in ((left, -1), (right, 1)):
+                x = exit_x + side
+                if solid((x, y)):
+                    continue
+                for drop in range(1, MAX_DROP + 1):
+                    if solid((x, y + drop)):
+                        break
+                    target = self.cell_segment.get((x, y + drop))
+                    if target is not None:
+                        self.links[index].append((target, exit_x, side, "drop"))
+                        if drop <= JUMP_HEIGHT:
+                            self.links[target].append((index, x, -side, "jump"))
+                        break
+
+    def segment_at(self, rect):
+        # Prefers the cell under the centre, then either foot, so an entity
+        # hanging over a ledge still counts as standing on it.
+        y = (rect.bottom - 1) // self.tile_size
+        for x in (rect.centerx, rect.left, rect.right - 1):
+            segment = self.cell_segment.get((x // self.tile_size, y))
+            if segment is not None:
+                return segment
+        return None
+
+    def flow(self, target, kinds=GROUND_KINDS):
+        key = (target, kinds)
+        if key not in self.flows:
+            reverse = [[] for segment in self.segments]
+            for index, links in enumerate(self.links):
+                for link in links:
+                    if link[3] in kinds:
+                        reverse[link[0]].append((index, link))
+
+            next_link = {target: None}
+            queue = deque([target])
+            while queue:
+                current = queue.popleft()
+                for source, link in reverse[current]:
+                    if source not in next_link:
+                        next_link[source] = link
+                        queue.append(source)
+            self.flows[key] = next_link
+        return self.flows[key]
+
+    def direction(self, rect, target_rect, kinds=GROUND_KINDS):
+        # Which way to walk (-1, 0 or 1) to get from rect to target_rect, or
+        # None if either is off the graph or no route exists.
+        start = self.segment_at(rect)
+        target = self.segment_at(target_rect)
+        if start is None or target is None:
+            return None
+        if start == target:
+            dx = target_rect.centerx - rect.centerx
+            return (dx > 0) - (dx < 0)
+
+        link = self.flow(target, kinds).get(start)
+        if link is None:
+            return None
+        exit_x, side = link[1], link[2]
+        x = rect.centerx // self.tile_size
+        if (x - exit_x) * side >= 0:
+            return side
+        return 1 if exit_x > x else -1
@@ -1,25 +1,43 @@
 class Particle:
+    __slots__ = ('game', 'type', 'pos', 'velocity', 'animation', 'frame')
+    
     def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
         self.game = game
         self.type = p_type
         self.pos = list(pos)
         self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+        self.animation = self.game.assets['particle/' + p_type]
+        self.frame = frame
     
     def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        kill = self.animation.done(self.frame)
         
         self.pos[0] += self.velocity[0]
         self.pos[1] += self.velocity[1]
         
-        self.animation.update()
+        self.frame = self.animation.advance(self.frame)
         
         return kill
     
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
+        img = self.animation.img(self.frame)
         surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
-    
\ No newline at end of file
+    
+def update_particles(particles):
+    # Same as calling update() on each particle, with the cursor advance
+    # inlined; returns the particles that are still alive.
+    alive = []
+    for particle in particles:
+        clip = particle.animation
+        frame = particle.frame
+        if clip.loop:
+            particle.frame = (frame + 1) % clip.length
+        else:
+            if frame < clip.length - 1:
+                alive.append(particle)
+            particle.frame = min(frame + 1, clip.length - 1)
+        pos = particle.pos
+        velocity = particle.velocity
+        pos[0] += velocity[0]
+        pos[1] += velocity[1]
+    return alive
@@ -0,0 +1,74 @@
+import random
+from collections import deque
+
+# Optional work, in the order it is shed under frame-time pressure and the
+# reverse of the order it comes back in.
+STAGES = ("effects", "leaves", "glow", "outline", "clouds")
+
+# Milliseconds of work per frame (the clock's raw time, without the wait for
+# the frame cap) the governor tries to stay under.
+FRAME_BUDGET = 14
+# Work comes back once the average falls below this share of the budget.
+HEADROOM = 0.6
+# Frames averaged per decision, which is also the wait after each change.
+WINDOW = 60
+# Share of spark and particle spawns kept while effects are shed.
+EFFECT_SCALE = 0.4
+DECISION_LOG = 32
+
+
+class QualityGovernor:
+    # Sheds one stage when the rolling average frame time goes over budget
+    # and restores one when there is headroom again. After each change the
+    # window starts over, so every decision is made on frames rendered at the
+    # current level.
+    def __init__(self, budget=FRAME_BUDGET, window=WINDOW, headroom=HEADROOM):
+        self.budget = budget
+        self.headroom = headroom
+        self.times = deque(maxlen=window)
+        self.level = 0
+        self.shed = set()
+        self.frame = 0
+        self.average = 0
+        self.decisions = deque(maxlen=DECISION_LOG)
+        # Every visual-only random draw (sparks, particles, screen shake,
+        # clouds) uses this generator, so effects and how many of them are
+        # shed never shift the shared one the simulation and snapshots replay.
+        self.random = random.Random()
+
+    def update(self, frame_ms):
+        self.frame += 1
+        self.times.append(frame_ms)
+        if len(self.times) < self.times.maxlen:
+            return
+        self.average = sum(self.times) / len(self.times)
+
+        if self.average > self.budget and self.level < len(STAGES):
+            stage = STAGES[self.level]
+            self.level += 1
+            self.shed.add(stage)
+            self.decisions.append((self.frame, "shed", stage, self.average))
+        elif self.average < self.budget * self.headroom and self.level:
+            self.level -= 1
+            stage = STAGES[self.level]
+            self.shed.discard(stage)
+            self.decisions.append((self.frame, "restore", stage, self.average))
+        else:
+            return
+        self.times.clear()
+
+    def enabled(self, stage):
+        return stage not in self.shed
+
+    def count(self, n):
+        # How many of n sparks or particles to spawn.
+        if "effects" in self.shed:
+            return max(1, int(n * EFFECT_SCALE))
+        return n
+
+    def summary(self):
+        shed = ", ".join(stage for stage in STAGES if stage in self.shed)
+        return (
+            f"quality {len(STAGES) - self.level}/{len(STAGES)}"
+            f" {self.average:.1f} ms" + (f" shed: {shed}" if shed else "")
+        )
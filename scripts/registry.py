@@ -0,0 +1,103 @@
+class Pool:
+    # Dense storage for one kind of object, handed out as (index, generation)
+    # handles. The index names a slot that follows its object through swap
+    # removals, and the slot's generation changes whenever its object goes, so
+    # a stale handle never resolves to whatever reuses the slot. Despawns are
+    # deferred to flush(), which lets callers despawn while iterating.
+    def __init__(self, objects=()):
+        self.items = []
+        self.owners = []
+        self.positions = []
+        self.generations = []
+        self.free = []
+        self.doomed = []
+        self.doomed_slots = set()
+        self.extend(objects)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def append(self, obj):
+        if self.free:
+            index = self.free.pop()
+        else:
+            index = len(self.positions)
+            self.positions.append(-1)
+            self.generations.append(0)
+        self.positions[index] = len(self.items)
+        self.items.append(obj)
+        self.owners.append(index)
+        return (index, self.generations[index])
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def alive(self, handle):
+        index, generation = handle
+        return self.generations[index] == generation
+
+    def get(self, handle):
+        if not self.alive(handle):
+            return None
+        return self.items[self.positions[handle[0]]]
+
+    def entries(self):
+        # Live (handle, object) pairs. Objects appended during the loop are
+        # not visited, and despawns wait for flush(), so nothing is copied.
+        for position in range(len(self.items)):
+            index = self.owners[position]
+            yield (index, self.generations[index]), self.items[position]
+
+    def despawn(self, handle):
+        # Returns False for stale handles and ones already waiting to go.
+        if not self.alive(handle) or handle[0] in self.doomed_slots:
+            return False
+        self.doomed_slots.add(handle[0])
+        self.doomed.append(handle[0])
+        return True
+
+    def remove_slot(self, index):
+        position = self.positions[index]
+        last = self.items.pop()
+        last_owner = self.owners.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.owners[position] = last_owner
+            self.positions[last_owner] = position
+        self.positions[index] = -1
+        self.generations[index] += 1
+        self.free.append(index)
+
+    def flush(self):
+        for index in self.doomed:
+            self.remove_slot(index)
+        self.doomed.clear()
+        self.doomed_slots.clear()
+
+    def reset(self, objects=()):
+        # Empties the pool, invalidating every handle it gave out.
+        for index in self.owners:
+            self.positions[index] = -1
+            self.generations[index] += 1
+            self.free.append(index)
+        self.items.clear()
+        self.owners.clear()
+        self.doomed.clear()
+        self.doomed_slots.clear()
+        self.extend(objects)
+
+
+class Registry:
+    def __init__(self, kinds):
+        self.pools = {kind: Pool() for kind in kinds}
+
+    def __getitem__(self, kind):
+        return self.pools[kind]
+
+    def flush(self):
+        for pool in self.pools.values():
+            pool.flush()
@@ -0,0 +1,309 @@
+import array
+import random
+import struct
+import sys
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from scripts.crowd import crowd_for
+from scripts.entities import Blob, Enemy
+
+# Binary snapshot layout (little-endian):
+#   header       magic, version, level, entity counts, flags
+#   world        counters, death state and camera scroll
+#   player       one PLAYER record
+#   enemies      one ENEMY record each
+#   blobs        one BLOB record each
+#   projectiles  one PROJECTILE record each
+#   rng          random module state, then numpy's if the RNG_NUMPY flag is set
+# Positions are stored as doubles so a restored world steps exactly like the
+# one it was taken from. Tiles, particles and sparks are not included: the
+# tilemap does not change during play and the rest is cosmetic.
+MAGIC = b"THSN"
+VERSION = 2
+HEADER = struct.Struct("<4sHHHHHB")
+WORLD = struct.Struct("<iiiiBdd")
+PLAYER = struct.Struct("<6d3i?5i?BH")
+ENEMY = struct.Struct("<4d2H3i?BHB")
+BLOB = struct.Struct("<2d2H2id2i2d??H")
+PROJECTILE = struct.Struct("<4diB")
+RANDOM = struct.Struct("<?d")
+NUMPY_RANDOM = struct.Struct("<i?d")
+
+RNG_NUMPY = 1
+MT_WORDS = 624
+
+ACTIONS = ("idle", "walk", "jump")
+DEATH_TYPES = (None, "fall", "health")
+OWNERS = ("player", "enemy")
+
+REWIND_CAPACITY = 120
+
+
+def _words(values):
+    words = array.array("I", values)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes()
+
+
+def _read_words(buf, offset, count):
+    words = array.array("I")
+    end = offset + words.itemsize * count
+    words.frombytes(buf[offset:end])
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words, end
+
+
+def _pack_rng(parts, flags):
+    version, state, gauss = random.getstate()
+    parts.append(_words(state))
+    parts.append(RANDOM.pack(gauss is not None, gauss or 0.0))
+    if flags & RNG_NUMPY:
+        name, keys, pos, has_gauss, cached = np.random.get_state()
+        parts.append(keys.astype("<u4").tobytes())
+        parts.append(NUMPY_RANDOM.pack(pos, bool(has_gauss), cached))
+
+
+def _unpack_rng(buf, offset, flags):
+    state, offset = _read_words(buf, offset, MT_WORDS + 1)
+    has_gauss, gauss = RANDOM.unpack_from(buf, offset)
+    offset += RANDOM.size
+    random.setstate((3, tuple(state), gauss if has_gauss else None))
+    if flags & RNG_NUMPY:
+        keys = np.frombuffer(buf, dtype="<u4", count=MT_WORDS, offset=offset)
+        offset += keys.nbytes
+        pos, has_gauss, cached = NUMPY_RANDOM.unpack_from(buf, offset)
+        offset += NUMPY_RANDOM.size
+        np.random.set_state(("MT19937", keys.astype(np.uint32), pos, has_gauss, cached))
+    return offset
+
+
+def _set_pose(entity, action, frame, flip):
+    entity.action = action
+    entity.animation = entity.game.assets[entity.type + "/" + action]
+    entity.frame = frame
+    entity.flip = flip
+
+
+def capture(game):
+    # Packs the simulation state of the live level into bytes.
+    if game.crowd is not None:
+        game.crowd.sync()
+
+    player = game.player
+    # numpy's generator is only drawn from by a blob crowd, and reading its
+    # state is slow, so it is only saved while one is active.
+    flags = RNG_NUMPY if game.crowd is not None else 0
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            game.level,
+            len(game.enemies),
+            len(game.blobs),
+            len(game.projectiles),
+            flags,
+        ),
+        WORLD.pack(
+            game.enemies_defeated,
+            game.blobs_defeated,
+            game.dead,
+            game.screenshake,
+            DEATH_TYPES.index(game.death_type),
+            game.scroll[0],
+            game.scroll[1],
+        ),
+        PLAYER.pack(
+            player.pos[0],
+            player.pos[1],
+            player.velocity[0],
+            player.velocity[1],
+            player.last_movement[0],
+            player.last_movement[1],
+            player.air_time,
+            player.jumps,
+            player.dashing,
+            player.wall_slide,
+            player.health,
+            player.shoot_cooldown,
+            player.ammo,
+            player.dash_duration,
+            player.collisions,
+            player.flip,
+            ACTIONS.index(player.action),
+            player.frame,
+        ),
+    ]
+    for enemy in game.enemies:
+        parts.append(
+            ENEMY.pack(
+                enemy.pos[0],
+                enemy.pos[1],
+                enemy.velocity[0],
+                enemy.velocity[1],
+                enemy.size[0],
+                enemy.size[1],
+                enemy.health,
+                enemy.walking,
+                enemy.hit_timer,
+                enemy.flip,
+                ACTIONS.index(enemy.action),
+                enemy.frame,
+                enemy.collisions,
+            )
+        )
+    for blob in game.blobs:
+        parts.append(
+            BLOB.pack(
+                float(blob.pos[0]),
+                float(blob.pos[1]),
+                blob.size[0],
+                blob.size[1],
+                blob.health,
+                blob.hit_timer,
+                blob.shoot_cooldown,
+                blob.chase_timer,
+                blob.idle_timer,
+                blob.idle_movement[0],
+                blob.idle_movement[1],
+                blob.state == "chase",
+                blob.flip,
+                blob.frame,
+            )
+        )
+    for projectile in game.projectiles:
+        parts.append(
+            PROJECTILE.pack(
+                projectile["pos"][0],
+                projectile["pos"][1],
+                projectile["vel"][0],
+                projectile["vel"][1],
+                projectile.get("timer", 0),
+                OWNERS.index(projectile["owner"]),
+            )
+        )
+    _pack_rng(parts, flags)
+    return b"".join(parts)
+
+
+def restore(game, data):
+    # Rebuilds the live level's entities from a snapshot of the same level.
+    # Entity pools are emptied and refilled rather than edited, since
+    # entities that died after the snapshot was taken have to come back.
+    magic, version, level, enemies, blobs, projectiles, flags = HEADER.unpack_from(
+        data, 0
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a snapshot")
+    if level != game.level:
+        raise ValueError(f"snapshot is for level {level}, not {game.level}")
+    offset = HEADER.size
+
+    (
+        game.enemies_defeated,
+        game.blobs_defeated,
+        game.dead,
+        game.screenshake,
+        death_type,
+        scroll_x,
+        scroll_y,
+    ) = WORLD.unpack_from(data, offset)
+    offset += WORLD.size
+    game.death_type = DEATH_TYPES[death_type]
+    game.scroll = [scroll_x, scroll_y]
+    game.camera_offset = (int(scroll_x), int(scroll_y))
+
+    player = game.player
+    values = PLAYER.unpack_from(data, offset)
+    offset += PLAYER.size
+    player.pos = [values[0], values[1]]
+    player.velocity = [values[2], values[3]]
+    player.last_movement = [values[4], values[5]]
+    (
+        player.air_time,
+        player.jumps,
+        player.dashing,
+        player.wall_slide,
+        player.health,
+        player.shoot_cooldown,
+        player.ammo,
+        player.dash_duration,
+        player.collisions,
+    ) = values[6:15]
+    _set_pose(player, ACTIONS[values[16]], values[17], values[15])
+
+    game.enemies.reset()
+    for i in range(enemies):
+        values = ENEMY.unpack_from(data, offset)
+        offset += ENEMY.size
+        enemy = Enemy(game, (values[0], values[1]), (values[4], values[5]))
+        enemy.velocity = [values[2], values[3]]
+        enemy.health, enemy.walking, enemy.hit_timer = values[6:9]
+        enemy.collisions = values[12]
+        _set_pose(enemy, ACTIONS[values[10]], values[11], values[9])
+        game.enemies.append(enemy)
+
+    game.blobs.reset()
+    for i in range(blobs):
+        values = BLOB.unpack_from(data, offset)
+        offset += BLOB.size
+        blob = Blob(game, (values[0], values[1]), (values[2], values[3]))
+        (
+            blob.health,
+            blob.hit_timer,
+            blob.shoot_cooldown,
+            blob.chase_timer,
+            blob.idle_timer,
+        ) = values[4:9]
+        blob.idle_movement = (values[9], values[10])
+        blob.state = "chase" if values[11] else "idle"
+        blob.flip = values[12]
+        blob.frame = values[13]
+        game.blobs.append(blob)
+    game.crowd = crowd_for(game.blobs)
+
+    game.projectiles.reset()
+    for i in range(projectiles):
+        pos_x, pos_y, vel_x, vel_y, timer, owner = PROJECTILE.unpack_from(data, offset)
+        offset += PROJECTILE.size
+        game.projectiles.append(
+            {
+                "pos": [pos_x, pos_y],
+                "vel": [vel_x, vel_y],
+                "owner": OWNERS[owner],
+                "timer": timer,
+            }
+        )
+
+    _unpack_rng(data, offset, flags)
+    game.particles = []
+    game.sparks.reset()
+
+
+class SnapshotRing:
+    # The most recent snapshots of the current level, oldest dropped first.
+    def __init__(self, capacity=REWIND_CAPACITY):
+        self.snapshots = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, data):
+        self.snapshots.append(data)
+
+    def clear(self):
+        self.snapshots.clear()
+
+    def rewind(self, steps=1):
+        # Drops the newest steps - 1 snapshots and pops the one before them,
+        # or returns None if the ring is empty.
+        data = None
+        for i in range(min(steps, len(self.snapshots))):
+            data = self.snapshots.pop()
+        return data
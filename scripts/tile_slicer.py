@@ -1,5 +1,13 @@
 from PIL import Image
+import argparse
+import hashlib
+import json
+import math
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_FILE = ".tile_slicer_cache.json"
+IMAGE_EXTS = (".png", ".bmp", ".gif")
 
 
 def slice_and_resize_strip(
@@ -23,13 +31,7 @@ def slice_and_resize_strip(
         print(f"Error: The file '{image_path}' was not found.")
         return
 
-    # Check for the correct resampling filter attribute based on Pillow version
-    try:
-        # Pillow 9.1.0+
-        resample_filter = Image.Resampling.NEAREST
-    except AttributeError:
-        # Older Pillow versions
-        resample_filter = Image.NEAREST
+    resample_filter = get_resample_filter()
 
     total_width, image_height = img.size
 
@@ -76,29 +78,238 @@ def slice_and_resize_strip(
     )
 
 
+def get_resample_filter():
+    try:
+        # Pillow 9.1.0+
+        return Image.Resampling.NEAREST
+    except AttributeError:
+        # Older Pillow versions
+        return Image.NEAREST
+
+
+def slice_sheet(image_path, tile_width, tile_height, output_size):
+    """
+    Slices a sprite sheet into resized tiles, reading rows top to bottom and
+    tiles left to right. A horizontal strip is simply a sheet with one row.
+
+    Args:
+        image_path (str): The path to the input strip or sheet.
+        tile_width (int): The width of a single tile in the original sheet.
+        tile_height (int): The height of a single tile in the original sheet.
+        output_size (tuple): A tuple (width, height) for the resized output tiles.
+
+    Returns:
+        list: The resized tiles as Pillow images, in row-major order.
+    """
+    resample_filter = get_resample_filter()
+    with Image.open(image_path) as img:
+        columns = img.size[0] // tile_width
+        rows = img.size[1] // tile_height
+        tiles = []
+        for row in range(rows):
+            for column in range(columns):
+                left = column * tile_width
+                top = row * tile_height
+                tile = img.crop((left, top, left + tile_width, top + tile_height))
+                tiles.append(tile.resize(output_size, resample=resample_filter))
+    return tiles
+
+
+def save_tiles(tiles, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    for i, tile in enumerate(tiles):
+        tile.save(os.path.join(output_folder, f"{str(i).zfill(2)}.png"), "PNG")
+
+
+def save_atlas(tiles, output_size, atlas_path):
+    """
+    Packs tiles into a single square-ish atlas image and writes a JSON index
+    next to it listing each tile's (x, y, width, height) rect.
+
+    Args:
+        tiles (list): The tiles to pack, in the order they should be indexed.
+        output_size (tuple): The (width, height) shared by every tile.
+        atlas_path (str): The path of the atlas PNG; the index uses the same
+            name with a .json extension.
+    """
+    columns = max(1, math.ceil(math.sqrt(len(tiles))))
+    rows = max(1, math.ceil(len(tiles) / columns))
+    atlas = Image.new("RGBA", (columns * output_size[0], rows * output_size[1]))
+    frames = []
+    for i, tile in enumerate(tiles):
+        x = (i % columns) * output_size[0]
+        y = (i // columns) * output_size[1]
+        atlas.paste(tile, (x, y))
+        frames.append([x, y, output_size[0], output_size[1]])
+
+    os.makedirs(os.path.dirname(atlas_path) or ".", exist_ok=True)
+    atlas.save(atlas_path, "PNG")
+    with open(os.path.splitext(atlas_path)[0] + ".json", "w") as f:
+        json.dump({"image": os.path.basename(atlas_path), "frames": frames}, f)
+
+
+def job_hash(job):
+    """Hashes a job's source image together with its slicing settings."""
+    digest = hashlib.sha1()
+    with open(job["image"], "rb") as f:
+        digest.update(f.read())
+    settings = {key: value for key, value in job.items() if key != "image"}
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def job_output(job):
+    if job.get("atlas"):
+        return job["output"] + ".png"
+    return job["output"]
+
+
+def run_job(job):
+    """
+    Slices one strip or sheet described by a job dict and writes either a
+    folder of tiles or a packed atlas. Runs inside a worker process.
+
+    Args:
+        job (dict): Keys "image", "tile_width", "tile_height", "output_size",
+            "output" and optionally "atlas".
+
+    Returns:
+        tuple: The job's image path and the number of tiles written.
+    """
+    output_size = tuple(job["output_size"])
+    tiles = slice_sheet(
+        job["image"], job["tile_width"], job["tile_height"], output_size
+    )
+    if job.get("atlas"):
+        save_atlas(tiles, output_size, job_output(job))
+    else:
+        save_tiles(tiles, job["output"])
+    return job["image"], len(tiles)
+
+
+def run_batch(jobs, workers=None, cache_path=CACHE_FILE, force=False):
+    """
+    Processes many strips or sheets across a process pool, skipping jobs
+    whose source image and settings are unchanged since the last build.
+
+    Args:
+        jobs (list): Job dicts as accepted by run_job.
+        workers (int): Worker process count; defaults to the CPU count.
+        cache_path (str): Where source hashes from previous builds are kept.
+        force (bool): Rebuild every job even if its hash is unchanged.
+    """
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        cache = {}
+
+    todo = []
+    for job in jobs:
+        digest = job_hash(job)
+        if (
+            not force
+            and cache.get(job_output(job)) == digest
+            and os.path.exists(job_output(job))
+        ):
+            continue
+        todo.append((job, digest))
+
+    print(f"{len(jobs) - len(todo)} up to date, {len(todo)} to build.")
+    if not todo:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run_job, [job for job, digest in todo])
+        for (job, digest), (image_path, count) in zip(todo, results):
+            cache[job_output(job)] = digest
+            print(f"{image_path}: {count} tiles -> {job_output(job)}")
+
+    with open(cache_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def load_manifest(path):
+    """
+    Reads a JSON manifest holding a list of jobs. Relative image and output
+    paths are resolved against the manifest's directory, and "defaults" are
+    merged into every job.
+    """
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(path)
+    jobs = []
+    for entry in manifest["jobs"]:
+        job = dict(manifest.get("defaults", {}))
+        job.update(entry)
+        job["image"] = os.path.join(base, job["image"])
+        job["output"] = os.path.join(base, job["output"])
+        jobs.append(job)
+    return jobs
+
+
+def directory_jobs(input_folder, output_folder, tile_size, output_size, atlas):
+    jobs = []
+    for name in sorted(os.listdir(input_folder)):
+        if name.lower().endswith(IMAGE_EXTS):
+            jobs.append(
+                {
+                    "image": os.path.join(input_folder, name),
+                    "tile_width": tile_size[0],
+                    "tile_height": tile_size[1],
+                    "output_size": list(output_size),
+                    "output": os.path.join(output_folder, os.path.splitext(name)[0]),
+                    "atlas": atlas,
+                }
+            )
+    return jobs
+
+
 # ==============================================================================
 # --- HOW TO USE: Configure the variables below and run the script ---
 # ==============================================================================
 if __name__ == "__main__":
-    # 1. Path to your exported horizontal image strip.
-    INPUT_IMAGE_FILE = "0.png"
-
-    # 2. Dimensions (in pixels) of a SINGLE tile in your ORIGINAL image strip.
-    ORIGINAL_TILE_WIDTH = 32
-    ORIGINAL_TILE_HEIGHT = 32
-
-    # 3. The desired final dimensions (in pixels) for EACH output tile.
-    OUTPUT_TILE_WIDTH = 16
-    OUTPUT_TILE_HEIGHT = 16
-
-    # 4. Name of the folder where the resized tiles will be saved.
-    OUTPUT_FOLDER = "output_tiles_16x16"
-
-    # Run the function with your settings
-    slice_and_resize_strip(
-        image_path=INPUT_IMAGE_FILE,
-        tile_width=ORIGINAL_TILE_WIDTH,
-        tile_height=ORIGINAL_TILE_HEIGHT,
-        output_size=(OUTPUT_TILE_WIDTH, OUTPUT_TILE_HEIGHT),
-        output_folder=OUTPUT_FOLDER,
+    parser = argparse.ArgumentParser(
+        description="Slice strips and sprite sheets into tiles. With no "
+        "arguments the settings below are used for a single strip."
     )
+    parser.add_argument("input", nargs="?", help="manifest .json or strip folder")
+    parser.add_argument("--out", default="output_tiles", help="output folder")
+    parser.add_argument("--tile", nargs=2, type=int, default=[32, 32])
+    parser.add_argument("--size", nargs=2, type=int, default=[16, 16])
+    parser.add_argument("--atlas", action="store_true", help="pack into atlases")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--force", action="store_true", help="ignore the cache")
+    args = parser.parse_args()
+
+    if args.input:
+        if os.path.isdir(args.input):
+            batch = directory_jobs(
+                args.input, args.out, args.tile, args.size, args.atlas
+            )
+        else:
+            batch = load_manifest(args.input)
+        run_batch(batch, workers=args.jobs, force=args.force)
+    else:
+        # 1. Path to your exported horizontal image strip.
+        INPUT_IMAGE_FILE = "0.png"
+
+        # 2. Dimensions (in pixels) of a SINGLE tile in your ORIGINAL image strip.
+        ORIGINAL_TILE_WIDTH = 32
+        ORIGINAL_TILE_HEIGHT = 32
+
+        # 3. The desired final dimensions (in pixels) for EACH output tile.
+        OUTPUT_TILE_WIDTH = 16
+        OUTPUT_TILE_HEIGHT = 16
+
+        # 4. Name of the folder where the resized tiles will be saved.
+        OUTPUT_FOLDER = "output_tiles_16x16"
+
+        # Run the function with your settings
+        slice_and_resize_strip(
+            image_path=INPUT_IMAGE_FILE,
+            tile_width=ORIGINAL_TILE_WIDTH,
+            tile_height=ORIGINAL_TILE_HEIGHT,
+            output_size=(OUTPUT_TILE_WIDTH, OUTPUT_TILE_HEIGHT),
+            output_folder=OUTPUT_FOLDER,
+        )
@@ -1,7 +1,18 @@
-import json
+import gc
+import math
+from contextlib import contextmanager
+from itertools import chain
+from operator import itemgetter
 
 import pygame
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from scripts.mapfile import read_map, write_map
+
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
     tuple(sorted([(1, 0), (0, 1), (-1, 0)])): 1,
@@ -14,19 +25,90 @@ AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 4,
 }
 
-NEIGHBOR_OFFSETS = [
-    (-1, 0),
-    (-1, -1),
-    (0, -1),
-    (1, -1),
-    (1, 0),
-    (0, 0),
-    (-1, 1),
-    (0, 1),
-    (1, 1),
-]
 PHYSICS_TILES = {"grass", "stone"}
 AUTOTILE_TYPES = {"grass", "stone"}
+FLOOD_LIMIT = 1000000
+# Below this many rays the per-ray loop beats building the batched grid.
+RAYCAST_BATCH_MIN = 512
+# Off-grid tiles are bucketed into squares this many tiles wide, so render only
+# visits the buckets around the view. OFFGRID_REACH is how far an off-grid
+# image can extend right of and below its position (the blob spawner is 65px).
+OFFGRID_CELL = 8
+OFFGRID_REACH = 80
+# Edits of at least this many cells find neighbours with numpy rather than a
+# dict lookup per neighbour.
+BULK_EDIT_MIN = 1024
+
+# Same rules as AUTOTILE_MAP, indexed by a neighbour bitmask where bit i is
+# set when the neighbour at AUTOTILE_SHIFTS[i] has the same type.
+AUTOTILE_SHIFTS = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+AUTOTILE_VARIANTS = [None] * (1 << len(AUTOTILE_SHIFTS))
+for neighbors, variant in AUTOTILE_MAP.items():
+    AUTOTILE_VARIANTS[sum(1 << AUTOTILE_SHIFTS.index(shift) for shift in neighbors)] = (
+        variant
+    )
+
+
+def cell_array(locs):
+    # An (n, 2) int64 array of grid locations, from a sized iterable of them.
+    return np.fromiter(
+        chain.from_iterable(locs), dtype=np.int64, count=2 * len(locs)
+    ).reshape(-1, 2)
+
+
+def autotile_variants(coords, ids):
+    # AUTOTILE_VARIANTS for cells given as an (n, 2) array of locations and
+    # their type ids, -1 where a mask has no variant. A neighbour counts when
+    # it is one of the cells and has the same id.
+    #
+    # Neighbours are found by binary search over sorted, packed cell keys
+    # rather than in a dense grid, so a sparse map spread over a huge
+    # bounding box costs no more than a compact one. Searching in key order
+    # keeps memory access sequential; the masks are put back in input order
+    # afterwards.
+    xs = coords[:, 0] - coords[:, 0].min() + 1
+    ys = coords[:, 1] - coords[:, 1].min() + 1
+    width = xs.max() + 2
+    keys = ys * width + xs
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    sorted_ids = ids[order]
+    sorted_masks = np.zeros(len(keys), dtype=np.int32)
+    for bit, shift in enumerate(AUTOTILE_SHIFTS):
+        neighbor_keys = sorted_keys + (shift[1] * width + shift[0])
+        found = np.searchsorted(sorted_keys, neighbor_keys)
+        found[found == len(keys)] = 0
+        same = (sorted_keys[found] == neighbor_keys) & (sorted_ids[found] == sorted_ids)
+        sorted_masks |= same.astype(np.int32) << bit
+    masks = np.empty_like(sorted_masks)
+    masks[order] = sorted_masks
+
+    lut = np.array(
+        [-1 if variant is None else variant for variant in AUTOTILE_VARIANTS],
+        dtype=np.int32,
+    )
+    return lut[masks]
+
+
+@contextmanager
+def collector_paused():
+    # Bulk edits allocate a dict and a list for every tile, none of them in
+    # reference cycles, and the cyclic collector would rescan the whole heap
+    # several times over while they pile up. Paused, it catches up once after.
+    if not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def tile_state(tile):
+    if tile is None:
+        return None
+    return (tile["type"], tile["variant"])
 
 
 class Tilemap:
@@ -35,105 +117,588 @@ class Tilemap:
         self.tile_size = tile_size
         self.tilemap = {}
         self.offgrid_tiles = []
+        self.tile_index = {}
+        self.offgrid_index = {}
+        self.offgrid_cells = {}
+        self.offgrid_serial = 0
+        self.revision = 0
+        self.sight_cache = {}
+
+    def build_index(self):
+        self.tile_index = {}
+        for loc, tile in self.tilemap.items():
+            self._index(loc, tile)
+        self.build_offgrid_index()
+
+    def build_offgrid_index(self):
+        self.offgrid_index = {}
+        self.offgrid_cells = {}
+        self.offgrid_serial = 0
+        for tile in self.offgrid_tiles:
+            self._index_offgrid(tile)
+
+    def offgrid_cell(self, pos):
+        span = OFFGRID_CELL * self.tile_size
+        return (int(pos[0] // span), int(pos[1] // span))
+
+    def _index_offgrid(self, tile):
+        # The serial keeps render drawing overlapping tiles in the order they
+        # were added, whichever buckets they fall in.
+        self.offgrid_index.setdefault((tile["type"], tile["variant"]), []).append(tile)
+        self.offgrid_serial += 1
+        self.offgrid_cells.setdefault(self.offgrid_cell(tile["pos"]), []).append(
+            (self.offgrid_serial, tile)
+        )
+
+    def _index(self, loc, tile):
+        self.tile_index.setdefault((tile["type"], tile["variant"]), {})[loc] = tile
+
+    def _unindex(self, loc, tile):
+        id_pair = (tile["type"], tile["variant"])
+        bucket = self.tile_index[id_pair]
+        del bucket[loc]
+        if not bucket:
+            del self.tile_index[id_pair]
+
+    def set_tile(self, loc, tile_type, variant):
+        old_tile = self.tilemap.get(loc)
+        if old_tile is not None:
+            if old_tile["type"] == tile_type and old_tile["variant"] == variant:
+                return old_tile
+            self._unindex(loc, old_tile)
+
+        tile = {"type": tile_type, "variant": variant, "pos": [loc[0], loc[1]]}
+        self.tilemap[loc] = tile
+        self._index(loc, tile)
+        self.revision += 1
+        return tile
+
+    def set_variant(self, loc, variant):
+        # Tiles are replaced rather than mutated, so a shallow copy of the
+        # tilemap is a consistent snapshot.
+        tile = self.tilemap[loc]
+        if tile["variant"] != variant:
+            self._unindex(loc, tile)
+            tile = {"type": tile["type"], "variant": variant, "pos": tile["pos"]}
+            self.tilemap[loc] = tile
+            self._index(loc, tile)
+            self.revision += 1
+
+    def remove_tile(self, loc):
+        tile = self.tilemap.pop(loc, None)
+        if tile is not None:
+            self._unindex(loc, tile)
+            self.revision += 1
+        return tile
+
+    def add_offgrid(self, tile):
+        self.revision += 1
+        self.offgrid_tiles.append(tile)
+        self._index_offgrid(tile)
+
+    def remove_offgrid(self, tile):
+        self.revision += 1
+        self.offgrid_tiles.remove(tile)
+        id_pair = (tile["type"], tile["variant"])
+        bucket = self.offgrid_index[id_pair]
+        bucket.remove(tile)
+        if not bucket:
+            del self.offgrid_index[id_pair]
+        cell = self.offgrid_cell(tile["pos"])
+        entries = self.offgrid_cells[cell]
+        entries.pop(next(i for i, entry in enumerate(entries) if entry[1] == tile))
+        if not entries:
+            del self.offgrid_cells[cell]
+
+    def border(self, locs):
+        if np is None or len(locs) < BULK_EDIT_MIN:
+            ring = {(x + dx, y + dy) for x, y in locs for dx, dy in AUTOTILE_SHIFTS}
+            ring.difference_update(locs)
+            return ring
+
+        # Packs cells into keys with a margin of one cell on every side, so
+        # shifted keys never wrap into the next row.
+        coords = cell_array(locs)
+        left = coords[:, 0].min() - 1
+        top = coords[:, 1].min() - 1
+        width = coords[:, 0].max() - left + 2
+        keys = np.sort((coords[:, 1] - top) * width + (coords[:, 0] - left))
+        ring = []
+        for shift in AUTOTILE_SHIFTS:
+            neighbor_keys = keys + (shift[1] * width + shift[0])
+            found = np.searchsorted(keys, neighbor_keys)
+            found[found == len(keys)] = 0
+            ring.append(neighbor_keys[keys[found] != neighbor_keys])
+        ys, xs = np.divmod(np.concatenate(ring), width)
+        return set(zip((xs + left).tolist(), (ys + top).tolist()))
+
+    def apply(self, changes, autotile=False, border=None):
+        # changes maps loc -> (type, variant) or None. With autotile, the new
+        # cells get their final variants before they are written, and only
+        # the ring around them is re-autotiled afterwards.
+        if autotile:
+            if border is None:
+                border = self.border(changes)
+            changes = self._resolve_variants(changes, border)
+
+        self._write(changes)
+
+        if autotile:
+            for loc in border:
+                self.autotile_at(loc)
+
+    def _write(self, changes):
+        # set_tile and remove_tile for a whole batch: each tile_index bucket
+        # takes its new tiles in one update, and revision moves once.
+        tilemap = self.tilemap
+        added = {}
+        changed = False
+        for loc, state in changes.items():
+            old_tile = tilemap.get(loc)
+            if old_tile is None:
+                if state is None:
+                    continue
+            else:
+                if state == (old_tile["type"], old_tile["variant"]):
+                    continue
+                self._unindex(loc, old_tile)
+                if state is None:
+                    del tilemap[loc]
+                    changed = True
+                    continue
+            tile = {"type": state[0], "variant": state[1], "pos": [loc[0], loc[1]]}
+            tilemap[loc] = tile
+            if state not in added:
+                added[state] = {}
+            added[state][loc] = tile
+            changed = True
+
+        for id_pair, tiles in added.items():
+            self.tile_index.setdefault(id_pair, {}).update(tiles)
+        if changed:
+            self.revision += 1
+
+    def _resolve_variants(self, changes, border):
+        if np is not None and len(changes) >= BULK_EDIT_MIN:
+            return self._resolve_variants_batch(changes, border)
+
+        types = {
+            loc: None if state is None else state[0] for loc, state in changes.items()
+        }
+        for loc in border:
+            tile = self.tilemap.get(loc)
+            types[loc] = None if tile is None else tile["type"]
+
+        resolved = {}
+        for (x, y), state in changes.items():
+            if state is not None and state[0] in AUTOTILE_TYPES:
+                mask = 0
+                for bit, shift in enumerate(AUTOTILE_SHIFTS):
+                    if types[(x + shift[0], y + shift[1])] == state[0]:
+                        mask |= 1 << bit
+                if AUTOTILE_VARIANTS[mask] is not None:
+                    state = (state[0], AUTOTILE_VARIANTS[mask])
+            resolved[(x, y)] = state
+        return resolved
+
+    def _resolve_variants_batch(self, changes, border):
+        locs = list(changes)
+        types = [None if state is None else state[0] for state in changes.values()]
+        for loc in border:
+            tile = self.tilemap.get(loc)
+            types.append(None if tile is None else tile["type"])
+        locs += border
+
+        type_ids = {None: 0}
+        for tile_type in set(types):
+            type_ids.setdefault(tile_type, len(type_ids))
+        ids = np.fromiter(
+            map(type_ids.__getitem__, types), dtype=np.int32, count=len(types)
+        )
+        variants = autotile_variants(cell_array(locs), ids)
+
+        count = len(changes)
+        autotiled = [type_ids[t] for t in AUTOTILE_TYPES if t in type_ids]
+        found = np.flatnonzero(
+            np.isin(ids[:count], autotiled) & (variants[:count] >= 0)
+        )
+        # Each new state is packed into one code, so cells sharing a state
+        # share one tuple, as they would from a brush.
+        span = len(AUTOTILE_VARIANTS)
+        codes = (ids[found] * span + variants[found]).tolist()
+        names = {type_id: tile_type for tile_type, type_id in type_ids.items()}
+        states = {code: (names[code // span], code % span) for code in set(codes)}
+        resolved = dict(changes)
+        resolved.update(
+            zip(map(locs.__getitem__, found.tolist()), map(states.__getitem__, codes))
+        )
+        return resolved
+
+    def flood_region(self, start, limit=FLOOD_LIMIT):
+        # Cells connected to start holding the same tile type (or nothing),
+        # clamped to the map bounds so filling open space terminates. Returns
+        # (region, complete); complete is False when the region has more than
+        # limit cells, and region may then be an arbitrary part of the whole.
+        tile = self.tilemap.get(start)
+        target = None if tile is None else tile["type"]
+        min_x, min_y, max_x, max_y = self.bounds()
+        min_x, min_y = min(min_x, start[0]), min(min_y, start[1])
+        max_x, max_y = max(max_x, start[0]), max(max_y, start[1])
+
+        # A cell matches when its presence in cells is want: filling empty
+        # space stops at any tile, filling a type stays on that type's cells.
+        # Chunk checks only matter while some chunks are still on disk.
+        if target is None:
+            cells, want = self.tilemap, False
+        else:
+            cells, want = set(), True
+            for (tile_type, variant), bucket in self.tile_index.items():
+                if tile_type == target:
+                    cells.update(bucket)
+        partial = not self.fully_loaded()
+
+        def loaded(x, y):
+            return self.is_loaded((x * self.tile_size, y * self.tile_size))
+
+        # Scanline fill: each cell popped grows into the whole run of
+        # matching cells around it in its row, and the rows above and below
+        # the run are seeded once per run of matches rather than per cell.
+        region = set()
+        stack = [start]
+        while stack and len(region) < limit:
+            x, y = stack.pop()
+            if (x, y) in region:
+                continue
+            left = right = x
+            while (
+                left > min_x
+                and (left - 1, y) not in region
+                and ((left - 1, y) in cells) == want
+                and (not partial or loaded(left - 1, y))
+            ):
+                left -= 1
+            while (
+                right < max_x
+                and (right + 1, y) not in region
+                and ((right + 1, y) in cells) == want
+                and (not partial or loaded(right + 1, y))
+            ):
+                right += 1
+            region.update([(cx, y) for cx in range(left, right + 1)])
+
+            for ny in (y - 1, y + 1):
+                if not min_y <= ny <= max_y:
+                    continue
+                seeded = False
+                for cx in range(left, right + 1):
+                    loc = (cx, ny)
+                    if (
+                        loc not in region
+                        and (loc in cells) == want
+                        and (not partial or loaded(cx, ny))
+                    ):
+                        if not seeded:
+                            stack.append(loc)
+                        seeded = True
+                    else:
+                        seeded = False
+        return region, not stack and len(region) <= limit
+
+    def copy_region(self, top_left, bottom_right):
+        stamp = {"tiles": {}, "offgrid": []}
+        for x in range(top_left[0], bottom_right[0] + 1):
+            for y in range(top_left[1], bottom_right[1] + 1):
+                tile = self.tilemap.get((x, y))
+                if tile is not None:
+                    stamp["tiles"][(x - top_left[0], y - top_left[1])] = (
+                        tile["type"],
+                        tile["variant"],
+                    )
+
+        left = top_left[0] * self.tile_size
+        top = top_left[1] * self.tile_size
+        right = (bottom_right[0] + 1) * self.tile_size
+        bottom = (bottom_right[1] + 1) * self.tile_size
+        for tile in self.offgrid_tiles:
+            if left <= tile["pos"][0] < right and top <= tile["pos"][1] < bottom:
+                stamp["offgrid"].append(
+                    {
+                        "type": tile["type"],
+                        "variant": tile["variant"],
+                        "pos": [tile["pos"][0] - left, tile["pos"][1] - top],
+                    }
+                )
+        return stamp
+
+    def locations(self, id_pair):
+        return list(self.tile_index.get(id_pair, ()))
+
+    def count(self, id_pairs):
+        total = 0
+        for id_pair in set(id_pairs):
+            total += len(self.tile_index.get(id_pair, ()))
+            total += len(self.offgrid_index.get(id_pair, ()))
+        return total
+
+    def type_counts(self):
+        counts = {}
+        for index in (self.tile_index, self.offgrid_index):
+            for (tile_type, variant), bucket in index.items():
+                counts[tile_type] = counts.get(tile_type, 0) + len(bucket)
+        return counts
 
     def extract(self, id_pairs, keep=False):
+        id_pairs = list(dict.fromkeys(id_pairs))
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile["type"], tile["variant"]) in id_pairs:
+        for id_pair in id_pairs:
+            for tile in self.offgrid_index.get(id_pair, ()):
                 matches.append(tile.copy())
-                # if not keep:
-                #     self.offgrid_tiles.remove(tile)
 
-        for loc in list(self.tilemap):
-            tile = self.tilemap[loc]
-            if (tile["type"], tile["variant"]) in id_pairs:
+        for id_pair in id_pairs:
+            for loc, tile in list(self.tile_index.get(id_pair, {}).items()):
                 matches.append(tile.copy())
                 matches[-1]["pos"] = matches[-1]["pos"].copy()
                 matches[-1]["pos"][0] *= self.tile_size
                 matches[-1]["pos"][1] *= self.tile_size
                 if not keep:
-                    del self.tilemap[loc]
+                    self.remove_tile(loc)
 
         return matches
 
-    def tiles_around(self, pos):
-        tiles = []
-        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
-        for offset in NEIGHBOR_OFFSETS:
-            check_loc = (
-                str(tile_loc[0] + offset[0]) + ";" + str(tile_loc[1] + offset[1])
-            )
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
-        return tiles
+    def save_job(self, path):
+        # Snapshot now, write later: the returned job can run on any thread
+        # while editing continues.
+        map_data = {
+            "tilemap": dict(self.tilemap),
+            "tile_size": self.tile_size,
+            "offgrid": list(self.offgrid_tiles),
+        }
+        return lambda: write_map(path, map_data)
 
     def save(self, path):
-        f = open(path, "w")
-        json.dump(
-            {
-                "tilemap": self.tilemap,
-                "tile_size": self.tile_size,
-                "offgrid": self.offgrid_tiles,
-            },
-            f,
-        )
-        f.close()
+        self.save_job(path)()
 
     def load(self, path):
-        f = open(path, "r")
-        map_data = json.load(f)
-        f.close()
+        self.load_data(read_map(path))
 
+    def load_data(self, map_data):
         self.tilemap = map_data["tilemap"]
         self.tile_size = map_data["tile_size"]
         self.offgrid_tiles = map_data["offgrid"]
+        self.build_index()
+
+    def bounds(self):
+        if not self.tilemap:
+            return (0, 0, 0, 0)
+        xs = [loc[0] for loc in self.tilemap]
+        ys = [loc[1] for loc in self.tilemap]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def stream(self, rect, block=False):
+        pass
+
+    def is_loaded(self, pos):
+        return True
+
+    def fully_loaded(self):
+        return True
 
     def solid_check(self, pos):
-        tile_loc = (
-            str(int(pos[0] // self.tile_size))
-            + ";"
-            + str(int(pos[1] // self.tile_size))
-        )
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         if tile_loc in self.tilemap:
             if self.tilemap[tile_loc]["type"] in PHYSICS_TILES:
                 return self.tilemap[tile_loc]
 
-    def physics_rects_around(self, pos):
+    def physics_rects_in(self, rect):
         rects = []
-        for tile in self.tiles_around(pos):
-            if tile["type"] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(
-                        tile["pos"][0] * self.tile_size,
-                        tile["pos"][1] * self.tile_size,
-                        self.tile_size,
-                        self.tile_size,
+        left = rect.left // self.tile_size
+        right = (rect.right - 1) // self.tile_size
+        top = rect.top // self.tile_size
+        bottom = (rect.bottom - 1) // self.tile_size
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                tile = self.tilemap.get((x, y))
+                if tile is not None and tile["type"] in PHYSICS_TILES:
+                    rects.append(
+                        pygame.Rect(
+                            x * self.tile_size,
+                            y * self.tile_size,
+                            self.tile_size,
+                            self.tile_size,
+                        )
                     )
-                )
         return rects
 
+    def raycast(self, start, end):
+        # Amanatides-Woo traversal of the cells the segment passes through.
+        # Returns (hit_pos, loc) for the first solid cell, or None if clear.
+        loc = [int(start[0] // self.tile_size), int(start[1] // self.tile_size)]
+        end_loc = [int(end[0] // self.tile_size), int(end[1] // self.tile_size)]
+        delta = (end[0] - start[0], end[1] - start[1])
+
+        step = [0, 0]
+        t_max = [math.inf, math.inf]
+        t_delta = [math.inf, math.inf]
+        for axis in (0, 1):
+            if delta[axis] > 0:
+                step[axis] = 1
+                edge = (loc[axis] + 1) * self.tile_size
+            elif delta[axis] < 0:
+                step[axis] = -1
+                edge = loc[axis] * self.tile_size
+            else:
+                continue
+            t_max[axis] = (edge - start[axis]) / delta[axis]
+            t_delta[axis] = self.tile_size / abs(delta[axis])
+
+        t = 0
+        while t <= 1:
+            tile = self.tilemap.get(tuple(loc))
+            if tile is not None and tile["type"] in PHYSICS_TILES:
+                hit_pos = (start[0] + delta[0] * t, start[1] + delta[1] * t)
+                return hit_pos, tuple(loc)
+            if loc == end_loc:
+                return None
+            axis = 0 if t_max[0] < t_max[1] else 1
+            t = t_max[axis]
+            t_max[axis] += t_delta[axis]
+            loc[axis] += step[axis]
+        return None
+
+    def raycast_many(self, rays):
+        # raycast() for a list of (start, end) pairs, stepping every ray at
+        # once over a dense solid grid covering all of them.
+        if np is None or len(rays) < RAYCAST_BATCH_MIN:
+            return [self.raycast(start, end) for start, end in rays]
+
+        segments = np.array(rays, dtype=float).reshape(len(rays), 4)
+        start = segments[:, :2]
+        delta = segments[:, 2:] - start
+        loc = np.floor(start / self.tile_size).astype(int)
+        end_loc = np.floor(segments[:, 2:] / self.tile_size).astype(int)
+
+        origin = np.minimum(loc, end_loc).min(axis=0)
+        size = np.maximum(loc, end_loc).max(axis=0) - origin + 1
+        solid = np.zeros(size, dtype=bool)
+        buckets = [
+            bucket
+            for id_pair, bucket in self.tile_index.items()
+            if id_pair[0] in PHYSICS_TILES
+        ]
+        if sum(len(bucket) for bucket in buckets) < solid.size:
+            locs = np.array([loc for bucket in buckets for loc in bucket], dtype=int)
+            locs = locs.reshape(-1, 2) - origin
+            inside = ((locs >= 0) & (locs < size)).all(axis=1)
+            solid[locs[inside, 0], locs[inside, 1]] = True
+        else:
+            for x in range(size[0]):
+                for y in range(size[1]):
+                    tile = self.tilemap.get((int(origin[0]) + x, int(origin[1]) + y))
+                    if tile is not None and tile["type"] in PHYSICS_TILES:
+                        solid[x, y] = True
+
+        step = np.sign(delta).astype(int)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            edge = (loc + (delta > 0)) * self.tile_size
+            t_max = np.where(delta != 0, (edge - start) / delta, np.inf)
+            t_delta = np.where(delta != 0, self.tile_size / np.abs(delta), np.inf)
+
+        count = len(rays)
+        t = np.zeros(count)
+        hit = np.zeros(count, dtype=bool)
+        active = np.arange(count)
+        rows = np.arange(count)
+        while len(active):
+            cell = loc[active] - origin
+            is_solid = solid[cell[:, 0], cell[:, 1]]
+            hit[active[is_solid]] = True
+            arrived = (loc[active] == end_loc[active]).all(axis=1)
+            active = active[~(is_solid | arrived)]
+
+            axis = (t_max[active, 0] >= t_max[active, 1]).astype(int)
+            t[active] = t_max[active, axis]
+            t_max[active, axis] += t_delta[active, axis]
+            loc[active, axis] += step[active, axis]
+            active = active[t[active] <= 1]
+
+        hit_pos = start + delta * t[:, None]
+        results = [None] * count
+        for i in rows[hit].tolist():
+            results[i] = (tuple(hit_pos[i].tolist()), tuple(loc[i].tolist()))
+        return results
+
+    def line_of_sight(self, start, end):
+        # Memoised until clear_sight_cache(), which the game calls every frame,
+        # so several enemies asking about the same pair pay for one ray.
+        key = (int(start[0]), int(start[1]), int(end[0]), int(end[1]))
+        if key not in self.sight_cache:
+            self.sight_cache[key] = self.raycast(start, end) is None
+        return self.sight_cache[key]
+
+    def clear_sight_cache(self):
+        self.sight_cache = {}
+
+    def autotile_at(self, loc):
+        tile = self.tilemap.get(loc)
+        if tile is None or tile["type"] not in AUTOTILE_TYPES:
+            return
+
+        mask = 0
+        for bit, shift in enumerate(AUTOTILE_SHIFTS):
+            neighbor = self.tilemap.get((loc[0] + shift[0], loc[1] + shift[1]))
+            if neighbor is not None and neighbor["type"] == tile["type"]:
+                mask |= 1 << bit
+
+        variant = AUTOTILE_VARIANTS[mask]
+        if variant is not None:
+            self.set_variant(loc, variant)
+
+    def autotile_around(self, loc):
+        self.autotile_at(loc)
+        for shift in AUTOTILE_SHIFTS:
+            self.autotile_at((loc[0] + shift[0], loc[1] + shift[1]))
+
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = (
-                    str(tile["pos"][0] + shift[0])
-                    + ";"
-                    + str(tile["pos"][1] + shift[1])
-                )
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]["type"] == tile["type"]:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile["type"] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile["variant"] = AUTOTILE_MAP[neighbors]
+        if np is None or not self.tilemap:
+            for loc in list(self.tilemap):
+                self.autotile_at(loc)
+            return
+
+        locs = list(self.tilemap)
+        type_ids = {}
+        ids = np.fromiter(
+            (
+                type_ids.setdefault(tile["type"], len(type_ids) + 1)
+                for tile in self.tilemap.values()
+            ),
+            dtype=np.int32,
+            count=len(locs),
+        )
+        variants = autotile_variants(cell_array(locs), ids)
+        autotiled = [type_ids[t] for t in AUTOTILE_TYPES if t in type_ids]
+        for i in np.flatnonzero(np.isin(ids, autotiled) & (variants >= 0)):
+            self.set_variant(locs[i], int(variants[i]))
 
     def render(self, surf, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surf.blit(
-                self.game.assets[tile["type"]][tile["variant"]],
-                (tile["pos"][0] - offset[0], tile["pos"][1] - offset[1]),
+        left, top = self.offgrid_cell(
+            (offset[0] - OFFGRID_REACH, offset[1] - OFFGRID_REACH)
+        )
+        right, bottom = self.offgrid_cell(
+            (offset[0] + surf.get_width(), offset[1] + surf.get_height())
+        )
+        visible = []
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                visible += self.offgrid_cells.get((cx, cy), ())
+        visible.sort(key=itemgetter(0))
+
+        commands = []
+        for serial, tile in visible:
+            commands.append(
+                (
+                    self.game.assets[tile["type"]][tile["variant"]],
+                    (tile["pos"][0] - offset[0], tile["pos"][1] - offset[1]),
+                )
             )
 
         for x in range(
@@ -144,13 +709,16 @@ class Tilemap:
                 offset[1] // self.tile_size,
                 (offset[1] + surf.get_height()) // self.tile_size + 1,
             ):
-                loc = str(x) + ";" + str(y)
+                loc = (x, y)
                 if loc in self.tilemap:
                     tile = self.tilemap[loc]
-                    surf.blit(
-                        self.game.assets[tile["type"]][tile["variant"]],
+                    commands.append(
                         (
-                            tile["pos"][0] * self.tile_size - offset[0],
-                            tile["pos"][1] * self.tile_size - offset[1],
-                        ),
+                            self.game.assets[tile["type"]][tile["variant"]],
+                            (
+                                tile["pos"][0] * self.tile_size - offset[0],
+                                tile["pos"][1] * self.tile_size - offset[1],
+                            ),
+                        )
                     )
+        surf.blits(commands, doreturn=False)
@@ -19,23 +19,28 @@ def load_images(path):
 
 
 class Animation:
+    # A shared, read-only clip. Playback position lives on whoever plays it as
+    # a plain int frame, so switching clips or spawning allocates nothing.
+    __slots__ = ("images", "flipped", "loop", "img_duration", "length")
+
     def __init__(self, images, img_dur=5, loop=True):
-        self.images = images
+        self.images = tuple(images)
+        self.flipped = tuple(
+            pygame.transform.flip(img, True, False) for img in self.images
+        )
         self.loop = loop
         self.img_duration = img_dur
-        self.done = False
-        self.frame = 0
-
-    def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
+        self.length = img_dur * len(self.images)
 
-    def update(self):
+    def advance(self, frame):
         if self.loop:
-            self.frame = (self.frame + 1) % (self.img_duration * len(self.images))
-        else:
-            self.frame = min(self.frame + 1, self.img_duration * len(self.images) - 1)
-            if self.frame >= self.img_duration * len(self.images) - 1:
-                self.done = True
-
-    def img(self):
-        return self.images[int(self.frame / self.img_duration)]
+            return (frame + 1) % self.length
+        return min(frame + 1, self.length - 1)
+
+    def done(self, frame):
+        return not self.loop and frame >= self.length - 1
+
+    def img(self, frame, flip=False):
+        if flip:
+            return self.flipped[frame // self.img_duration]
+        return self.images[frame // self.img_duration]